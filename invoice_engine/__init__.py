@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+'''为途、德速、盈和发票填写脚本的公共模块'''
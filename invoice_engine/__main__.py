@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+'''
+python -m invoice_engine：一次运行生成本期全部货代的发票
+可以只生成部分发票，如：
+    python -m invoice_engine --forwarder 为途 --date 6.13
+    python -m invoice_engine --sheet 6.13为途普船VGT2
+'''
+import sys
+import argparse
+from invoice_engine import engine
+from invoice_engine.profiles import forwarder_profiles
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(prog='python -m invoice_engine', description='生成货代发票')
+    parser.add_argument('--forwarder', action='append', choices=list(forwarder_profiles), help='只生成该货代的发票，可重复指定')
+    parser.add_argument('--date', help='生成哪一期的发票，如6.13，默认运费计算器中最新的一期')
+    parser.add_argument('--sheet', action='append', help='只生成该sheet页的发票（名称精确匹配），可重复指定')
+    parser.add_argument('--force', action='store_true', help='输入数据没有变化的sheet页也重新生成发票')
+    parser.add_argument('--concurrent', action='store_true', help='并发模式（engine.run_async）')
+    return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    try:
+        if args.concurrent:
+            engine.run_async(args.forwarder, args.date, args.sheet, force=args.force)
+        else:
+            engine.run(args.forwarder, args.date, args.sheet, force=args.force)
+    except Exception as e:
+        print(f"程序运行出错: {str(e)}")
+        sys.exit(1)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+'''
+FBA货件收货地址（盈和发票使用）：按ShipmentID建立解析好的地址索引并保存在本地
+本地缓存过期（超过ttl）或缓存中没有查询的货件时下载FBA货件表重建索引，每次运行最多下载一次，之后的查询不再请求网络
+'''
+import os
+import json
+import time
+import threading
+from invoice_engine.sheets import get_sheet_values
+
+
+def get_empty_address(country_code=""):
+    return {
+        "delivery_address": "",
+        "country_code": country_code,
+        "city": "",
+        "continent": "",
+        "postcode": ""
+    }
+
+
+def parse_delivery_address(Delivery_address, country):
+    '''
+    拆分收货地址，地址最后一行形如"123 Road, Tracy, CA 95304-1234"
+    :return: {delivery_address: 地址最后一行, country_code: 国家, city: 城市, continent: 州, postcode: 邮编}，无法拆分的项为空
+    '''
+    address = get_empty_address(country)
+    try:
+        delivery_address = Delivery_address.split('\n')[-1]
+        address["delivery_address"] = delivery_address
+        Delivery_address_splited = delivery_address.split(',')
+        address["city"] = Delivery_address_splited[1].strip() if len(Delivery_address_splited) > 1 else ""
+        if len(Delivery_address_splited) > 2:
+            continent_and_postcode = Delivery_address_splited[2].strip().split(' ')
+            address["continent"] = continent_and_postcode[0].strip() if continent_and_postcode else ""
+            address["postcode"] = continent_and_postcode[1].strip() if len(continent_and_postcode) > 1 else ""
+    except Exception as e:
+        print(f"处理地址信息时出错: {str(e)}")
+    return address
+
+
+def build_shipment_address_index(values):
+    '''按ShipmentID(A列)建立解析好的收货地址索引，地址在F列、国家在G列；同一货件有多行时取第一行'''
+    index = {}
+    for row in values:
+        if len(row) < 7 or row[0] is None or row[0] in index:
+            continue
+        index[row[0]] = parse_delivery_address(row[5], row[6])
+    return index
+
+
+def load_shipment_address_cache(cache_path):
+    if not cache_path or not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"读取FBA货件地址缓存时出错: {str(e)}")
+        return {}
+
+
+def save_shipment_address_cache(cache_path, index):
+    '''先写临时文件再替换，中途出错不会留下写了一半的缓存'''
+    cache_dir = os.path.dirname(cache_path)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
+
+
+class ShipmentAddresses:
+    '''一次运行内的收货地址查询，由engine每次运行新建，传给需要查询地址的preparer'''
+
+    def __init__(self, spreadsheet_id, range_, cache_path, ttl=0):
+        '''
+        :param ttl: 本地缓存的有效秒数，0表示每次运行都重新下载（地址更正当次生效），None表示一直有效（只在出现新货件时下载）
+        '''
+        self.spreadsheet_id = spreadsheet_id
+        self.range_ = range_
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self._index = None
+        self._downloaded = False
+        self._lock = threading.Lock()
+
+    def is_cache_expired(self):
+        if self.ttl is None:
+            return False
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return True
+        return time.time() - os.path.getmtime(self.cache_path) >= self.ttl
+
+    def download(self):
+        '''下载整张FBA货件表重建索引，本次运行不再重复下载；下载失败时继续使用本地缓存'''
+        self._downloaded = True
+        try:
+            self._index = build_shipment_address_index(get_sheet_values(self.spreadsheet_id, self.range_))
+            print(f"FBA货件地址缓存已更新，共{len(self._index)}个货件")
+            if self.cache_path:
+                save_shipment_address_cache(self.cache_path, self._index)
+        except Exception as e:
+            print(f"获取地址信息时出错: {str(e)}")
+
+    def get(self, ShipmentID):
+        '''返回货件的收货地址，查不到或下载失败时各项为空'''
+        with self._lock:
+            if self._index is None:
+                self._index = load_shipment_address_cache(self.cache_path)
+                if self.is_cache_expired():
+                    self.download()
+            if ShipmentID not in self._index and not self._downloaded:
+                # 本地缓存中没有的货件（新货件）
+                self.download()
+            address = self._index.get(ShipmentID)
+        return dict(address) if address else get_empty_address()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+'''
+边生成边打包：把一组发票文件以zip流的形式逐块输出，整个压缩包不会放在内存或磁盘上
+xlsx等本身已经压缩过的文件直接存入（ZIP_STORED），不再重复压缩
+'''
+import os
+import time
+import zipfile
+
+# 本身已压缩的文件类型，再压缩几乎不变小，只浪费CPU
+compressed_extensions = ('.xlsx', '.xlsm', '.zip', '.jpg', '.jpeg', '.png')
+# 读文件、输出数据块的大小
+chunk_size = 1024 * 1024
+
+
+class ZipChunkWriter:
+    '''zipfile的输出目标：只把写入的数据暂存起来，由生成器随时取走；不支持seek，zipfile会改用数据描述符记录大小和CRC'''
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_zip(files):
+    '''
+    把文件逐个写入zip并按块输出
+    :param files: 可迭代的(本地路径, 压缩包内路径)，可以是边生成边产出的生成器
+    :return: zip数据块的生成器
+    '''
+    writer = ZipChunkWriter()
+    with zipfile.ZipFile(writer, 'w') as archive:
+        for path, arcname in files:
+            if not os.path.exists(path):
+                print(f"打包发票时文件不存在，跳过: {path}")
+                continue
+            zip_info = zipfile.ZipInfo.from_file(path, arcname)
+            if path.lower().endswith(compressed_extensions):
+                zip_info.compress_type = zipfile.ZIP_STORED
+            else:
+                zip_info.compress_type = zipfile.ZIP_DEFLATED
+            with open(path, 'rb') as source, archive.open(zip_info, 'w', force_zip64=True) as target:
+                while True:
+                    data = source.read(chunk_size)
+                    if not data:
+                        break
+                    target.write(data)
+                    yield writer.pop()
+            yield writer.pop()
+    # 关闭后写入的中央目录
+    yield writer.pop()
+
+
+def iter_produced_files(files, is_done, poll_interval=0.5):
+    '''
+    按顺序产出一个仍在增长的文件列表中的文件，列表不再增长（is_done()为真且已全部产出）时结束
+    :param files: 生成过程中不断追加路径的列表
+    :param is_done: 生成是否已结束
+    '''
+    index = 0
+    while True:
+        if index < len(files):
+            yield files[index]
+            index += 1
+        elif is_done():
+            # 结束前再检查一次，避免漏掉结束前刚追加的文件
+            if index >= len(files):
+                break
+        else:
+            time.sleep(poll_interval)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from openpyxl.utils import get_column_letter
+from invoice_engine.sheets import get_sheet_values
+
+
+# 解析后的运费计算器表按列存放：{列名: 该列全部产品行的值}
+calculator_columns = ('product_name', 'product_box_num', 'real_weight', 'box_size', 'product_set_number')
+
+
+def to_number(value):
+    '''云表格按字符串返回的数字转换为int或float，无法转换的值原样返回'''
+    if not isinstance(value, str):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def parse_product_rows(rows, layout):
+    '''
+    从列数符合的行中取出产品行并按货代的运费计算器列布局解析为按列存放的表
+    :param layout: 货代配置中的calculator，见profiles.py
+    :return: {列名: 值列表}，列名见calculator_columns；箱数为int，实重和每箱套数能转换时为数字
+    '''
+    columns = layout['columns']
+    # 过滤出产品行：关键列都有值
+    filtered_rows = [row for row in rows if all(row[i] is not None for i in layout['required_columns'])]
+    if layout['skip_header']:
+        filtered_rows = filtered_rows[1:]
+    if not filtered_rows:
+        return {name: [] for name in calculator_columns}
+    # 整表转置一次，之后按列处理
+    column_values = list(zip(*filtered_rows))
+    table = {name: list(column_values[columns[name]]) for name in calculator_columns}
+    table['product_name'] = [product_name.strip() for product_name in table['product_name']]
+    table['product_box_num'] = [int(to_number(box_num)) for box_num in table['product_box_num']]
+    table['real_weight'] = [to_number(real_weight) for real_weight in table['real_weight']]
+    table['product_set_number'] = [to_number(set_number) for set_number in table['product_set_number']]
+    return table
+
+
+def parse_shipping_calculator_table(values, layout):
+    '''解析整张sheet页数据：产品行的列数固定为row_length'''
+    return parse_product_rows([row for row in values if len(row) == layout['row_length']], layout)
+
+
+def get_last_used_column(layout):
+    '''解析产品行用到的最后一列（从0开始），之后的公式列不需要下载'''
+    return max(list(layout['required_columns']) + list(layout['columns'].values()))
+
+
+def find_product_row_indexes(tail_values):
+    '''
+    tail_values为从第row_length列到sheet页最后一列的探测数据，与下载整行时len(row) == row_length的判断对应：
+    行数据不返回末尾空单元格时，该行最后一个有值的单元格正好在第row_length列；行数据补齐到sheet页宽度时，sheet页正好有row_length列
+    :return: 列数符合的行下标（从0开始）
+    '''
+    return [idx for idx, row in enumerate(tail_values) if len(row) == 1]
+
+
+def get_shipping_calculator_table(spreadsheet_id, range_, profile, row_count=None, column_count=None):
+    '''
+    下载运费计算器云表格数据
+    已知sheet页的行数和列数时先探测第row_length列找出产品行所在的行范围，再只下载这些行中解析用到的列，
+    不下载右侧大量的公式列；不知道sheet页大小时下载整张sheet页
+    '''
+    layout = profile['calculator']
+    row_length = layout['row_length']
+    if not row_count or not column_count or column_count < row_length:
+        values = get_sheet_values(spreadsheet_id, range_)
+        return parse_shipping_calculator_table(values, layout)
+
+    tail_range = f'{range_}!{get_column_letter(row_length)}1:{get_column_letter(column_count)}{row_count}'
+    product_row_indexes = find_product_row_indexes(get_sheet_values(spreadsheet_id, tail_range))
+    if not product_row_indexes:
+        return parse_product_rows([], layout)
+
+    first_row, last_row = product_row_indexes[0], product_row_indexes[-1]
+    last_column = get_last_used_column(layout)
+    values = get_sheet_values(spreadsheet_id, f'{range_}!A{first_row + 1}:{get_column_letter(last_column + 1)}{last_row + 1}')
+    rows = []
+    for idx in product_row_indexes:
+        if idx - first_row < len(values):
+            row = values[idx - first_row]
+            # 末尾空单元格可能不返回，补齐后按列号取值
+            rows.append(row + [None] * (last_column + 1 - len(row)))
+    return parse_product_rows(rows, layout)
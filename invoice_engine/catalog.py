@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import re
+import json
+from collections import defaultdict
+from invoice_engine.feishu import feishu_post
+
+# 多维表格records/search单次filter条件数上限
+max_filter_conditions = 50
+# 多维表格records/search单页记录数上限
+max_page_size = 500
+# 多维表格接口错误码：筛选条件中的字段不存在
+field_name_not_found_code = 1254045
+
+
+class BitableError(RuntimeError):
+    '''多维表格接口返回非0错误码，code为飞书错误码'''
+
+    def __init__(self, code, msg):
+        super().__init__(f"多维表查询失败: {code}, {msg}")
+        self.code = code
+
+
+def clean_product_names(product_name):
+    '''将运费计算器中的品名拆成多维表格可匹配的品名，混箱如'A x2，B x3'拆为['A', 'B']'''
+    if '，' in product_name or ',' in product_name:
+        names = [mixed_product.split('x')[0].strip() for mixed_product in re.split(r'[，,]', product_name)]
+    else:
+        names = [product_name.strip()]
+    # 飞书多维表格无法匹配中文符号'×'，仓储表里已删掉该符号，匹配时也相应去掉
+    return [name.replace('×', '') for name in names if name]
+
+
+def collect_product_names(product_name_lists):
+    '''汇总所有sheet页运费计算器中的品名并去重'''
+    product_names = []
+    seen = set()
+    for product_name_list in product_name_lists:
+        for product_name in product_name_list:
+            for name in clean_product_names(product_name):
+                if name not in seen:
+                    seen.add(name)
+                    product_names.append(name)
+    return product_names
+
+
+def get_field_text(fields, field_name):
+    '''读取多维表格文本字段的完整内容'''
+    return ''.join(segment.get('text', '') for segment in fields.get(field_name, []))
+
+
+def parse_product_record(fields):
+    '''将多维表格记录字段转换为发票所需的产品信息'''
+    return {
+        "Img_file_token": fields.get('图片', [{}])[0].get('file_token', ''),
+        "Img_name": fields.get('M-SKU', [{}])[0].get('text', ''),
+        "Chinese_name": fields.get('品名简称//——6/5', [{}])[0].get('text', ''),
+        "English_name": fields.get('英文品名', [{}])[0].get('text', ''),
+        "price_rmb": fields.get('进价：每件/套￥', ''),
+        "price": fields.get('进价：每件/套＄', ''),
+        "Material": fields.get('材质', [{}])[0].get('text', ''),
+        "HS_code": fields.get('HS编码', [{}])[0].get('text', ''),
+        "Application": fields.get('用途', [{}])[0].get('text', ''),
+        "brand": fields.get('品牌', [{}])[0].get('text', ''),
+        "SKU": fields.get('SKU', [{}])[0].get('text', ''),
+        "M_SKU": fields.get('M-SKU', [{}])[0].get('text', '')
+    }
+
+
+def search_records(filter_, app_token, table_id, automatic_fields=False):
+    '''
+    多维表分页查询记录，返回全部命中的原始记录，filter_为None时返回整张表
+    任一页查询失败（字段不存在、限流等）时抛出BitableError，不返回不完整的结果
+    '''
+    url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/records/search"
+    body = {}
+    if filter_:
+        body["filter"] = filter_
+    if automatic_fields:
+        # 返回记录的创建时间、最后修改时间等系统字段
+        body["automatic_fields"] = True
+    items = []
+    page_token = None
+    while True:
+        params = {"page_size": max_page_size}
+        if page_token:
+            params["page_token"] = page_token
+        response = feishu_post(url, params=params, data=json.dumps(body))
+        res_data = response.json()
+        if res_data.get('code') != 0:
+            raise BitableError(res_data.get('code'), res_data.get('msg'))
+        data = res_data.get('data', {})
+        items.extend(data.get('items') or [])
+        if not data.get('has_more'):
+            break
+        page_token = data.get('page_token')
+    return items
+
+
+def search_products_by_names(product_names, app_token, table_id, field_name='品名', automatic_fields=False):
+    '''按品名批量查询多维表格，每次请求用or条件合并最多max_filter_conditions个品名，返回原始记录'''
+    items = []
+    for i in range(0, len(product_names), max_filter_conditions):
+        chunk = product_names[i:i + max_filter_conditions]
+        filter_ = {
+            "conjunction": "or",
+            "conditions": [
+                {
+                    "field_name": field_name,
+                    "operator": "is",
+                    "value": [name]
+                }
+                for name in chunk
+            ]
+        }
+        items.extend(search_records(filter_, app_token, table_id, automatic_fields))
+    return items
+
+
+def resolve_product_catalog(product_names, app_token, table_id, field_name='品名'):
+    '''
+    批量查询多维表格产品信息
+    :param product_names: 去重后的品名列表
+    :return: 品名到产品信息列表的映射，未找到的品名不在映射中
+    '''
+    product_catalog = defaultdict(list)
+    wanted = set(product_names)
+    for item in search_products_by_names(product_names, app_token, table_id, field_name):
+        fields = item.get('fields', {})
+        name = get_field_text(fields, field_name).strip()
+        if name in wanted:
+            product_catalog[name].append(parse_product_record(fields))
+    print(f"批量查询产品信息：共{len(product_names)}个品名，找到{len(product_catalog)}个")
+    return dict(product_catalog)
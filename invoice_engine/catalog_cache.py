@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import sqlite3
+from collections import defaultdict
+from invoice_engine import config
+from invoice_engine.catalog import BitableError, field_name_not_found_code, get_field_text, parse_product_record, search_records, search_products_by_names
+
+# 多维表格的日期筛选只比较到天，增量同步从上次同步时间的前一天开始筛选，同一天内稍后修改的记录也会拉取（重复拉取的记录直接覆盖）
+sync_overlap_ms = 24 * 60 * 60 * 1000
+
+
+def open_catalog_cache(cache_path):
+    '''打开仓储多维表格本地缓存（SQLite），不存在时自动建表'''
+    cache_dir = os.path.dirname(cache_path)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    conn = sqlite3.connect(cache_path)
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS product (
+            record_id TEXT PRIMARY KEY,
+            table_key TEXT NOT NULL,
+            product_name TEXT,
+            m_sku TEXT,
+            last_modified_time INTEGER,
+            fields TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_product_name ON product (table_key, product_name);
+        CREATE INDEX IF NOT EXISTS idx_product_m_sku ON product (table_key, m_sku);
+        CREATE TABLE IF NOT EXISTS sync_state (
+            table_key TEXT PRIMARY KEY,
+            last_sync_time INTEGER
+        );
+    ''')
+    return conn
+
+
+def get_last_sync_time(conn, table_key):
+    '''读取上次同步到的最大修改时间（毫秒时间戳），从未同步过返回None'''
+    row = conn.execute('SELECT last_sync_time FROM sync_state WHERE table_key = ?', (table_key,)).fetchone()
+    return row[0] if row else None
+
+
+def save_records(conn, table_key, items):
+    '''写入/更新多维表格原始记录，返回本批记录中最大的修改时间'''
+    latest = None
+    for item in items:
+        fields = item.get('fields', {})
+        last_modified_time = item.get('last_modified_time')
+        conn.execute(
+            'INSERT OR REPLACE INTO product (record_id, table_key, product_name, m_sku, last_modified_time, fields) VALUES (?, ?, ?, ?, ?, ?)',
+            (item.get('record_id'), table_key, get_field_text(fields, '品名').strip(), get_field_text(fields, 'M-SKU').strip(), last_modified_time, json.dumps(fields, ensure_ascii=False))
+        )
+        if last_modified_time and (latest is None or last_modified_time > latest):
+            latest = last_modified_time
+    return latest
+
+
+def sync_catalog_cache(conn, app_token, table_id, full=False):
+    '''
+    增量同步仓储多维表格到本地缓存，只拉取上次同步之后修改过的记录
+    :param full: 为True时全量重新同步（多维表格中删除的记录只有全量同步才会从缓存中移除）
+    :return: 本次同步写入的记录数
+    查询失败时抛出异常，本地缓存和同步时间都保持不变，下次同步从原来的时间继续
+    '''
+    table_key = f'{app_token}/{table_id}'
+    last_sync_time = None if full else get_last_sync_time(conn, table_key)
+    if last_sync_time is None:
+        # 首次或全量同步：拉取整张表
+        items = search_records(None, app_token, table_id, automatic_fields=True)
+    else:
+        filter_ = {
+            "conjunction": "and",
+            "conditions": [
+                {
+                    "field_name": config.multidimensional_table_modified_time_field,
+                    "operator": "isGreater",
+                    "value": ["ExactDate", str(last_sync_time - sync_overlap_ms)]
+                }
+            ]
+        }
+        try:
+            items = search_records(filter_, app_token, table_id, automatic_fields=True)
+        except BitableError as e:
+            if e.code != field_name_not_found_code:
+                raise
+            # 修改时间字段不存在（被删除或改名）时无法增量同步，改为全量同步，避免缓存从此不再更新
+            print(f"！！！！！！！！！！仓储多维表格中没有修改时间字段'{config.multidimensional_table_modified_time_field}'，"
+                  f"本次改为全量同步，请检查config.multidimensional_table_modified_time_field！！！！！！！！！！")
+            last_sync_time = None
+            items = search_records(None, app_token, table_id, automatic_fields=True)
+    # 全部分页查询成功后才开始写入，写入中途出错时整个事务回滚
+    with conn:
+        if last_sync_time is None:
+            conn.execute('DELETE FROM product WHERE table_key = ?', (table_key,))
+        latest = save_records(conn, table_key, items)
+        if latest is not None and (last_sync_time is None or latest > last_sync_time):
+            conn.execute('INSERT OR REPLACE INTO sync_state (table_key, last_sync_time) VALUES (?, ?)', (table_key, latest))
+    print(f"仓储多维表格本地缓存同步完成，更新{len(items)}条记录")
+    return len(items)
+
+
+def lookup_products(conn, app_token, table_id, column, values):
+    '''按品名(product_name)或M-SKU(m_sku)从本地缓存读取产品信息，返回值到产品信息列表的映射'''
+    if column not in ('product_name', 'm_sku'):
+        raise ValueError(f"不支持的查询列: {column}")
+    table_key = f'{app_token}/{table_id}'
+    results = defaultdict(list)
+    values = list(values)
+    # SQLite单条语句的参数个数有上限，分批查询
+    for i in range(0, len(values), 500):
+        chunk = values[i:i + 500]
+        placeholders = ','.join('?' * len(chunk))
+        rows = conn.execute(
+            f'SELECT {column}, fields FROM product WHERE table_key = ? AND {column} IN ({placeholders}) ORDER BY rowid',
+            [table_key, *chunk]
+        )
+        for value, fields in rows:
+            results[value].append(parse_product_record(json.loads(fields)))
+    return dict(results)
+
+
+def sync_product_catalog_cache(app_token, table_id, cache_path):
+    '''打开本地缓存并增量同步一次'''
+    conn = open_catalog_cache(cache_path)
+    try:
+        return sync_catalog_cache(conn, app_token, table_id)
+    except Exception as e:
+        # 同步失败时继续使用已有的缓存，缓存中没有的品名仍会直接查询多维表格
+        print(f"仓储多维表格本地缓存同步失败: {str(e)}")
+        return 0
+    finally:
+        conn.close()
+
+
+def resolve_product_catalog_cached(product_names, app_token, table_id, cache_path, sync=True):
+    '''
+    优先从本地缓存读取产品信息，缓存中没有的品名再批量查询多维表格并写回缓存
+    :param sync: 读取前是否先增量同步，本次运行已同步过时传False
+    :return: 品名到产品信息列表的映射，未找到的品名不在映射中
+    '''
+    conn = open_catalog_cache(cache_path)
+    try:
+        if sync:
+            try:
+                sync_catalog_cache(conn, app_token, table_id)
+            except Exception as e:
+                print(f"仓储多维表格本地缓存同步失败: {str(e)}")
+        product_catalog = lookup_products(conn, app_token, table_id, 'product_name', product_names)
+        missing_names = [name for name in product_names if name not in product_catalog]
+        if missing_names:
+            items = search_products_by_names(missing_names, app_token, table_id, automatic_fields=True)
+            with conn:
+                save_records(conn, f'{app_token}/{table_id}', items)
+            product_catalog.update(lookup_products(conn, app_token, table_id, 'product_name', missing_names))
+        print(f"产品信息：共{len(product_names)}个品名，找到{len(product_catalog)}个，其中{len(missing_names)}个缓存未命中")
+        return product_catalog
+    finally:
+        conn.close()
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+'''三个货代发票共用的配置，各货代自己的模板和保存地址在profiles.py中'''
+
+shipping_calculator_spreadsheet_id = 'xx' # 运费计算器id
+multidimensional_table_token = 'xx' # 仓储多维表格token
+multidimensional_table_id = 'xx' # 仓储多维表格id
+multidimensional_table_view_id = 'xx' # 仓储多维表格view_id
+multidimensional_table_modified_time_field = '最后更新时间' # 仓储多维表格中的修改时间字段名，本地缓存增量同步按该字段筛选
+product_catalog_cache_path = r'D:\work\data\发票\仓储多维表格缓存.sqlite3' # 仓储多维表格本地缓存地址
+fba_shipment_details_table_id = 'xx' # FBA表格id
+fba_shipment_details_table_range = 'xx!A:O' # FBA货件明细表range
+fba_shipment_table_id = 'xx' # FBA货件表格id（盈和发票查询收货地址）
+fba_shipment_table_range = 'xx!A:G' # FBA货件表range
+fba_address_cache_path = r'D:\work\data\发票\FBA货件地址缓存.json' # 按ShipmentID解析好的收货地址本地缓存地址
+fba_address_cache_ttl = 0 # 收货地址本地缓存的有效秒数，0表示每次运行都重新下载一次FBA货件表（地址更正当次生效，下载失败时使用本地缓存），None表示一直有效（只在出现新货件时下载）
+render_processes = None # 发票渲染进程数，None表示按CPU核数，0表示在当前进程渲染（便于调试）
+streaming_row_threshold = 2000 # 产品行数达到该值的发票用流式（write_only）模式写出以节省内存，None表示始终写入模板副本
+job_workers = 1 # 同时执行的发票生成任务数（HTTP接口登记的任务排队执行）
+max_kept_jobs = 100 # 保留最近多少个发票生成任务的记录供查询
+fba_batch_cache_max_entries = 100000 # 每次运行最多缓存多少组(货代, M-SKU, 仓库, 判断列)筛选好的FBA批次，被淘汰的组再用到时重新筛选（已分配的数量另行记录，不受影响）
+fba_batch_cache_ttl = None # 筛选好的FBA批次的缓存秒数，None表示整个运行期间有效
+run_report_dir = r'D:\work\data\发票\运行报告' # 每次运行的JSON报告（各阶段耗时、接口调用次数和字节数、每个sheet页耗时）保存地址，None表示不保存
@@ -0,0 +1,453 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import asyncio
+from itertools import accumulate
+from collections import defaultdict
+from invoice_engine import config
+from invoice_engine.sheets import get_sheet_info
+from invoice_engine.calculator import calculator_columns, get_shipping_calculator_table
+from invoice_engine.manifest import get_inputs_hash, is_invoice_unchanged, record_invoice
+from invoice_engine.fba import get_fba_shipment_details_index, get_fba_shipment_details_table
+from invoice_engine.run_cache import RunCache
+from invoice_engine.addresses import ShipmentAddresses
+from invoice_engine.catalog import collect_product_names
+from invoice_engine.catalog_cache import resolve_product_catalog_cached, sync_product_catalog_cache
+from invoice_engine.pipeline import run_sheets_concurrently
+from invoice_engine.profiles import forwarder_profiles
+from invoice_engine.sheet_titles import parse_sheet_titles
+from invoice_engine.metrics import finish_run_report, record_stage, start_run_report, timed
+from invoice_engine.render import create_render_pool, submit_render
+
+
+def get_current_box_num_List(product_name_list, product_box_num_list):
+    '''
+    每个产品的箱号：按箱数列累加出各产品的起始箱号，多箱写成"起始-结束"
+    混箱的每个子产品各占发票一行，重复该产品的箱号
+    '''
+    box_starts = accumulate([1] + product_box_num_list[:-1])
+    mixed_counts = [len(re.split(r'[，,]', product_name)) for product_name in product_name_list]
+    box_labels = [
+        str(start) if box_num == 1 or (box_num < 1 and mixed_count == 1) else f"{start}-{start + box_num - 1}"
+        for start, box_num, mixed_count in zip(box_starts, product_box_num_list, mixed_counts)
+    ]
+    return [label for label, mixed_count in zip(box_labels, mixed_counts) for _ in range(mixed_count)]
+
+
+def build_reference_numbers(sheets_info):
+    """
+    根据运费计算器sheet页列表（已由parse_sheet_titles解析名称）一次性为所有货代、所有月份分配reference_number
+    编号规则：前缀+两位数月份+三位数当月该货代序号，如'LL123506020'，当月最早的sheet页为001（sheet页从新到旧排列），'一周'汇总页不参与编号
+    :return: {(货代, sheet页名称): reference_number}
+    """
+    sheet_lists = defaultdict(list)
+    for info in sheets_info:
+        title = info['title']
+        # 月份取自sheet名称开头，如'11.1为途加班美森ABE8已上传系统'的月份为11
+        if title['month'] is None or title['weekly_summary']:
+            continue
+        # 名称中含货代关键字的都参与该货代的编号（包括被排除、不生成发票的sheet页），保持已有编号不变
+        for name, profile in forwarder_profiles.items():
+            if profile['sheet_keyword'] in title['keywords']:
+                sheet_lists[(name, title['month'])].append(info['sheet_name'])
+
+    reference_numbers = {}
+    for (name, month), sheet_list in sheet_lists.items():
+        prefix = forwarder_profiles[name]['reference_prefix']
+        for idx, sheet_name in enumerate(reversed(sheet_list)):
+            reference_numbers[(name, sheet_name)] = f"{prefix}{str(month).zfill(2)}{str(idx + 1).zfill(3)}"
+    return reference_numbers
+
+
+def get_reference_number(reference_numbers, sheet_name, profile):
+    '''从build_reference_numbers的结果中取出sheet页的reference_number，找不到时返回None'''
+    reference_number = reference_numbers.get((profile['name'], sheet_name))
+    if reference_number is None:
+        print(f"生成reference_number时出错: 未找到对应的sheet页: {sheet_name}")
+    return reference_number
+
+
+def build_sheet_invoice(info, shipping_calculator_table, product_catalog, fba_shipment_details_index, fba_batches, fba_ledger, reference_numbers, profile):
+    '''
+    匹配单个sheet页的产品信息与FBA货件明细，返回写入发票所需的数据
+    :param fba_batches: 本次运行筛选好的FBA批次（RunCache），同一次运行的所有sheet页共用
+    :param fba_ledger: 本次运行的FBA分批剩余数量，同一次运行的所有sheet页共用
+    '''
+    sheet_name = info.get('sheet_name')
+    amazon_warehouse_code = info['title']['warehouse_code']
+    if amazon_warehouse_code is None:
+        raise ValueError(f"sheet页名称中没有仓库代码: {sheet_name}")
+    sheet_range = info.get('sheet_range')
+    print(f"===================当前处理sheet页数据: {sheet_name}, Range: {sheet_range}, amazon_warehouse_code: {amazon_warehouse_code}===================")
+    product_name_list = shipping_calculator_table['product_name']
+    product_box_num_list = shipping_calculator_table['product_box_num']
+    product_info_list = []
+    total_box_num = sum(product_box_num_list)
+    current_box_num_List = get_current_box_num_List(product_name_list, product_box_num_list)
+    print('product_name_list:{}, product_box_num_list:{}, current_box_num_List:{}'.format(product_name_list, product_box_num_list, current_box_num_List))
+
+    def append_product_rows(product_name_clean, product_num, product_box_num, real_weight, box_size, product_set_number, is_mixed):
+        '''按品名查产品信息、匹配FBA货件明细，每条货件明细生成一行发票数据'''
+        declaration_quantity = product_num * product_box_num
+        info_list = product_catalog.get(product_name_clean)
+        if not info_list:
+            print(f"！！！！！！！！！！！！！！未找到产品详细信息: {product_name_clean}")
+            return
+
+        for product_info in info_list:
+            M_SKU = product_info["M_SKU"]
+            fba_shipment_details = get_fba_shipment_details_table(fba_shipment_details_index, fba_batches, fba_ledger, amazon_warehouse_code, info['title'], declaration_quantity, M_SKU, profile)
+            if not fba_shipment_details:
+                print(f"！！！！！！！！！！！！！！未找到FBA货件明细: {product_name_clean}, {M_SKU}")
+                continue
+            for details in fba_shipment_details:
+                try:
+                    product_info_list.append({
+                        "ShipmentID": details["ShipmentID"],
+                        "ReferenceID": details["ReferenceID"],
+                        "Amazon_warehouse_code": amazon_warehouse_code,
+                        "product_box_num": product_box_num,
+                        "Img_file_token": product_info["Img_file_token"],
+                        "Img_name": ('混箱' if is_mixed else '') + product_info["Img_name"],
+                        "Chinese_name": product_info["Chinese_name"],
+                        "English_name": product_info["English_name"],
+                        "price_rmb": product_info["price_rmb"],
+                        "price": product_info["price"],
+                        "Declared_quantity": details["Declared_quantity"],
+                        "SKU": product_info["SKU"],
+                        "M_SKU": M_SKU,
+                        "Material": product_info["Material"],
+                        "HS_code": product_info["HS_code"],
+                        "brand": product_info["brand"],
+                        "box_size": box_size,
+                        "real_weight": real_weight,
+                        "Application": product_info["Application"],
+                        "product_num": product_num,  # 每箱数量
+                        "product_set_number": product_set_number,
+                        "declaration_quantity": declaration_quantity,  # 每箱数量*箱数
+                        "is_mixed": is_mixed,
+                        "FBA_batches": details["batches"]  # 本行用到的FBA货件批次及数量
+                    })
+                except Exception as e:
+                    print(f"处理货件明细时出错: {str(e)}")
+                    continue
+
+    for product_name, product_box_num, real_weight, box_size, product_set_number in zip(*(shipping_calculator_table[name] for name in calculator_columns)):
+        try:
+            if '，' in product_name or ',' in product_name:
+                mixed_products = re.split(r'[，,]', product_name)
+                for mixed_product in mixed_products:
+                    try:
+                        # 飞书多维表格无法匹配中文符号'×'，仓储表中已删掉该符号，匹配时也相应去掉
+                        product_name_clean = mixed_product.split('x')[0].strip().replace('×', '')
+                        product_num = int(mixed_product.split('x')[1].strip())
+                        print(f'混箱中的:{product_name_clean}, 申报量:{product_num * product_box_num}, 箱数:{product_box_num}')
+                        append_product_rows(product_name_clean, product_num, product_box_num, real_weight, box_size, product_set_number, True)
+                    except Exception as e:
+                        print(f"处理混箱产品时出错: {str(e)}")
+                        continue
+            else:
+                try:
+                    product_name_clean = product_name.strip().replace('×', '')
+                    product_num = int(product_set_number)
+                    print(f'正常单品单箱的:{product_name_clean}, 申报量:{product_num * product_box_num}, 箱数:{product_box_num}')
+                    append_product_rows(product_name_clean, product_num, product_box_num, real_weight, box_size, product_set_number, False)
+                except Exception as e:
+                    print(f"处理单品时出错: {str(e)}")
+                    continue
+        except Exception as e:
+            print(f"处理产品 {product_name} 时出错: {str(e)}")
+            continue
+
+    return {
+        "forwarder": profile['name'],
+        "sheet_name": sheet_name,
+        "reference_number": get_reference_number(reference_numbers, sheet_name, profile),
+        "product_info_list": product_info_list,
+        "amazon_warehouse_code": amazon_warehouse_code,
+        "current_box_num_List": current_box_num_List,
+        "total_box_num": total_box_num,
+        "product_name_list": product_name_list,
+        "product_box_num_list": product_box_num_list
+    }
+
+
+def write_sheet_invoice(sheet_invoice, render_pool=None, manifests=None, force=False, shipment_addresses=None):
+    '''
+    检查数量一致性，执行货代的准备工作（下载图片、查询地址等）后把发票交给渲染进程池
+    输入与发票生成记录中相同且发票文件还在时不再重新生成
+    :param manifests: 本次运行的发票生成记录{保存目录: 记录}，None表示不使用记录，每次都重新生成
+    :param force: 忽略发票生成记录，全部重新生成
+    :param shipment_addresses: 本次运行的收货地址查询（ShipmentAddresses），传给货代的preparer
+    :return: 渲染任务，不生成发票时返回None
+    '''
+    profile = forwarder_profiles[sheet_invoice['forwarder']]
+    sheet_name = sheet_invoice['sheet_name']
+    product_info_list = sheet_invoice['product_info_list']
+    current_box_num_List = sheet_invoice['current_box_num_List']
+
+    try:
+        if not product_info_list:
+            print(f"product_info_list为空，异常情况！！！！！！！！！！！！！！！！！！！！{sheet_name}")
+        elif len(current_box_num_List) != len(product_info_list):
+            print(len(current_box_num_List), len(product_info_list), product_info_list)
+            print(f"！！！！！！！！！！！！！！！！！！！！写入数量不一致，请手动排查: {sheet_name}！！！！！！！！！！！！！！！！！！！！")
+        else:
+            keyword = profile['sheet_keyword']
+            modified_sheet_name = sheet_name.replace(keyword, f" {sheet_invoice['reference_number']}{keyword}")
+            invoice_file_path = os.path.join(profile['save_path'], f'{modified_sheet_name}.xlsx')
+            render_task = {
+                'sheet_name': sheet_name,
+                'save_path': profile['save_path'],
+                'invoice_file_path': invoice_file_path,
+                'inputs_hash': None,
+                'future': None
+            }
+            # 准备工作补充的收货地址等也是发票内容，先准备再计算哈希
+            if profile['preparer'] is not None:
+                profile['preparer'](sheet_invoice, profile, shipment_addresses)
+            if manifests is not None:
+                render_task['inputs_hash'] = get_inputs_hash(sheet_invoice, profile)
+                if not force and is_invoice_unchanged(manifests, profile['save_path'], sheet_name, render_task['inputs_hash'], invoice_file_path):
+                    return render_task
+            render_task['future'] = submit_render(render_pool, sheet_invoice, profile, invoice_file_path)
+            return render_task
+    except Exception as e:
+        print(f"写入文件时出错: {str(e)}")
+    return None
+
+
+def wait_sheet_invoice(render_task, manifests=None):
+    '''等待write_sheet_invoice交出的渲染任务完成并更新发票生成记录，返回发票路径（包括沿用的已有发票），未生成时返回None'''
+    if render_task is None:
+        return None
+    invoice_file_path = render_task['invoice_file_path']
+    if render_task['future'] is None:
+        print(f"输入数据没有变化，沿用已有发票: {invoice_file_path}")
+        return invoice_file_path
+    try:
+        # 渲染进程返回各步骤耗时
+        for step, seconds in render_task['future'].result().items():
+            record_stage(step, seconds, render_task['sheet_name'])
+        print(f"发票已生成: {invoice_file_path}")
+    except Exception as e:
+        print(f"写入文件时出错: {str(e)}")
+        return None
+    if manifests is not None:
+        try:
+            record_invoice(manifests, render_task['save_path'], render_task['sheet_name'], render_task['inputs_hash'], invoice_file_path)
+        except Exception as e:
+            print(f"更新发票生成记录时出错: {str(e)}")
+    return invoice_file_path
+
+
+def get_current_date(sheets_info):
+    '''运费计算器第二个sheet页是本期最新的sheet页，从其名称中取出本期日期，如6.13'''
+    return sheets_info[1]['title']['date']
+
+
+def select_target_sheets(sheets_info, current_date, forwarder_names=None, sheet_names=None):
+    '''
+    按解析好的sheet页名称筛选出需要生成发票的sheet页，返回[(sheet页信息, 货代配置)]，一周汇总页不生成发票
+    :param sheet_names: 指定sheet页名称（精确匹配，不限日期），None表示日期为current_date的全部sheet页
+    '''
+    target_sheets = []
+    for info in sheets_info:
+        title = info['title']
+        if sheet_names is not None:
+            if info['sheet_name'] not in sheet_names:
+                continue
+        elif title['date'] != current_date:
+            continue
+        if title['forwarder'] is None or title['weekly_summary']:
+            continue
+        if forwarder_names is not None and title['forwarder'] not in forwarder_names:
+            continue
+        target_sheets.append((info, forwarder_profiles[title['forwarder']]))
+    if sheet_names is not None:
+        found_sheet_names = {info['sheet_name'] for info, profile in target_sheets}
+        for sheet_name in sheet_names:
+            if sheet_name not in found_sheet_names:
+                print(f"未找到需要生成发票的sheet页: {sheet_name}")
+    return target_sheets
+
+
+def select_replay_sheets(sheets_info, target_sheets):
+    '''
+    FBA批次按sheet页顺序分配，只生成部分sheet页时，同一期同一货代排在目标sheet页前面、本次未选中的sheet页也要按顺序重新分配一遍（不生成发票），
+    这样目标sheet页分到的批次与生成整期发票时相同，不会用到前面sheet页已经用掉的批次
+    :return: [(sheet页信息, 货代配置)]，生成整期发票时为空
+    '''
+    target_sheet_names = {info['sheet_name'] for info, profile in target_sheets}
+    # {(日期, 货代): 最后一个目标sheet页的位置}
+    last_target_positions = {}
+    for position, info in enumerate(sheets_info):
+        if info['sheet_name'] in target_sheet_names:
+            last_target_positions[(info['title']['date'], info['title']['forwarder'])] = position
+    replay_sheets = []
+    for position, info in enumerate(sheets_info):
+        title = info['title']
+        if info['sheet_name'] in target_sheet_names or title['weekly_summary']:
+            continue
+        if position < last_target_positions.get((title['date'], title['forwarder']), -1):
+            replay_sheets.append((info, forwarder_profiles[title['forwarder']]))
+    return replay_sheets
+
+
+def run(forwarder_names=None, current_date=None, sheet_names=None, on_invoice=None, force=False, report=None):
+    '''
+    生成本期发票：运费计算器sheet页列表、FBA货件明细和产品信息只获取一次，所有货代共用
+    只下载目标sheet页的运费计算器数据和其中的产品信息，没有目标sheet页时不再下载FBA货件明细
+    :param forwarder_names: 需要生成的货代，如['为途']，None表示全部货代
+    :param current_date: 生成哪一期的发票，如'6.13'，None表示运费计算器中最新的一期
+    :param sheet_names: 只生成这些sheet页的发票（精确匹配名称），None表示当期全部sheet页
+    :param on_invoice: 每生成一张发票就以发票路径调用一次，如HTTP接口边生成边打包下载
+    :param force: 忽略各货代保存目录下的发票生成记录，输入没有变化的sheet页也重新生成
+    :param report: 记录本次运行各阶段耗时和接口调用的RunReport，None时新建；运行结束后保存到config.run_report_dir
+    :return: 本次生成的发票路径列表（包括输入没有变化、沿用的已有发票）
+    单个sheet页出错时跳过该sheet页；获取sheet页列表、FBA货件明细等整次运行都需要的数据出错时抛出异常
+    '''
+    invoice_files = []
+    report = start_run_report(report)
+    # {保存目录: 发票生成记录}，第一次用到某个货代的保存目录时读取
+    manifests = {}
+    # FBA批次和分批剩余数量只在本次运行内有效，HTTP服务中多次运行互不影响；批次可被淘汰，剩余数量不会
+    fba_batches = RunCache(config.fba_batch_cache_max_entries, config.fba_batch_cache_ttl)
+    fba_ledger = {}
+    # 盈和发票的收货地址索引本次运行最多下载一次FBA货件表，本地缓存未过期且没有新货件时不下载
+    shipment_addresses = ShipmentAddresses(config.fba_shipment_table_id, config.fba_shipment_table_range, config.fba_address_cache_path, config.fba_address_cache_ttl)
+    # 发票在渲染进程池中生成，主进程继续处理后面的sheet页
+    render_pool = create_render_pool()
+    try:
+        # 全部sheet页名称一次解析，筛选、判断列和发票编号都使用解析结果
+        with timed('sheet_list'):
+            sheets_info = parse_sheet_titles(get_sheet_info(config.shipping_calculator_spreadsheet_id))
+        if current_date is None:
+            current_date = get_current_date(sheets_info)
+        target_sheets = select_target_sheets(sheets_info, current_date, forwarder_names, sheet_names)
+        if not target_sheets:
+            print("没有需要生成发票的sheet页")
+            return invoice_files
+        replay_sheets = select_replay_sheets(sheets_info, target_sheets)
+        replay_sheet_names = {info['sheet_name'] for info, profile in replay_sheets}
+        if replay_sheets:
+            print(f"先按顺序重新分配前面{len(replay_sheets)}个sheet页的FBA批次（不生成发票）: {sorted(replay_sheet_names)}")
+        # FBA货件明细表每次运行只下载一次，按(M-SKU, 仓库代码)建立索引供所有sheet页查找
+        fba_shipment_details_index = get_fba_shipment_details_index(config.fba_shipment_details_table_id, config.fba_shipment_details_table_range)
+        # 所有发票编号根据同一份sheet页列表一次分配，不再每写一张发票请求一次
+        reference_numbers = build_reference_numbers(sheets_info)
+
+        # 先下载全部目标sheet页的运费计算器数据，汇总所有品名后批量查询多维表格，避免逐个品名请求
+        shipping_calculator_tables = {}
+        for info, profile in target_sheets + replay_sheets:
+            try:
+                with timed('calculator', info['sheet_name']):
+                    shipping_calculator_tables[info['sheet_name']] = (get_shipping_calculator_table(config.shipping_calculator_spreadsheet_id, info['sheet_range'], profile, info.get('row_count'), info.get('column_count')), profile)
+            except Exception as e:
+                print(f"下载sheet {info['sheet_name']} 运费计算器数据时出错: {str(e)}")
+        product_name_lists = [calculator_table['product_name'] for calculator_table, profile in shipping_calculator_tables.values()]
+        with timed('catalog'):
+            product_catalog = resolve_product_catalog_cached(collect_product_names(product_name_lists), config.multidimensional_table_token, config.multidimensional_table_id, config.product_catalog_cache_path)
+
+        render_tasks = []
+        for info in sheets_info:
+            try:
+                if info['sheet_name'] in shipping_calculator_tables:
+                    shipping_calculator_table, profile = shipping_calculator_tables[info['sheet_name']]
+                    with timed('match', info['sheet_name']):
+                        sheet_invoice = build_sheet_invoice(info, shipping_calculator_table, product_catalog, fba_shipment_details_index, fba_batches, fba_ledger, reference_numbers, profile)
+                    if info['sheet_name'] in replay_sheet_names:
+                        continue
+                    render_tasks.append(write_sheet_invoice(sheet_invoice, render_pool, manifests, force, shipment_addresses))
+            except Exception as e:
+                print(f"处理sheet {info['sheet_name']} 时出错: {str(e)}")
+                continue
+        for render_task in render_tasks:
+            invoice_file_path = wait_sheet_invoice(render_task, manifests)
+            if invoice_file_path is not None:
+                invoice_files.append(invoice_file_path)
+                if on_invoice is not None:
+                    on_invoice(invoice_file_path)
+
+    finally:
+        if render_pool is not None:
+            render_pool.shutdown()
+        finish_run_report(report, config.run_report_dir)
+    return invoice_files
+
+
+def run_async(forwarder_names=None, current_date=None, sheet_names=None, on_invoice=None, force=False, report=None, max_concurrency=8):
+    '''
+    并发模式：同时下载本期全部目标sheet页、产品信息和FBA货件明细，每个sheet页数据齐全后立即交给渲染进程池生成发票
+    forwarder_names、current_date、sheet_names、on_invoice、force、report同run，位置参数的顺序也与run相同
+    :param max_concurrency: 同时下载的sheet页数
+    :return: 本次生成的发票路径列表（按生成完成的先后顺序），出错时同run
+    '''
+    invoice_files = []
+    report = start_run_report(report)
+    # {保存目录: 发票生成记录}，第一次用到某个货代的保存目录时读取
+    manifests = {}
+    # FBA批次和分批剩余数量只在本次运行内有效，HTTP服务中多次运行互不影响；批次可被淘汰，剩余数量不会
+    fba_batches = RunCache(config.fba_batch_cache_max_entries, config.fba_batch_cache_ttl)
+    fba_ledger = {}
+    # 盈和发票的收货地址索引本次运行最多下载一次FBA货件表，本地缓存未过期且没有新货件时不下载
+    shipment_addresses = ShipmentAddresses(config.fba_shipment_table_id, config.fba_shipment_table_range, config.fba_address_cache_path, config.fba_address_cache_ttl)
+    render_pool = create_render_pool()
+    try:
+        # 全部sheet页名称一次解析，筛选、判断列和发票编号都使用解析结果
+        with timed('sheet_list'):
+            sheets_info = parse_sheet_titles(get_sheet_info(config.shipping_calculator_spreadsheet_id))
+        if current_date is None:
+            current_date = get_current_date(sheets_info)
+        target_sheets = select_target_sheets(sheets_info, current_date, forwarder_names, sheet_names)
+        if not target_sheets:
+            print("没有需要生成发票的sheet页")
+            return invoice_files
+        replay_sheets = select_replay_sheets(sheets_info, target_sheets)
+        replay_sheet_names = {info['sheet_name'] for info, profile in replay_sheets}
+        if replay_sheets:
+            print(f"先按顺序重新分配前面{len(replay_sheets)}个sheet页的FBA批次（不生成发票）: {sorted(replay_sheet_names)}")
+        reference_numbers = build_reference_numbers(sheets_info)
+        sheet_profiles = {info['sheet_name']: profile for info, profile in target_sheets + replay_sheets}
+
+        def fetch_sheet(info):
+            with timed('calculator', info['sheet_name']):
+                return get_shipping_calculator_table(config.shipping_calculator_spreadsheet_id, info['sheet_range'], sheet_profiles[info['sheet_name']], info.get('row_count'), info.get('column_count'))
+
+        def resolve_sheet(info, shipping_calculator_table, shared):
+            product_names = collect_product_names([shipping_calculator_table['product_name']])
+            with timed('catalog', info['sheet_name']):
+                product_catalog = resolve_product_catalog_cached(product_names, config.multidimensional_table_token, config.multidimensional_table_id, config.product_catalog_cache_path, sync=False)
+            return shipping_calculator_table, product_catalog
+
+        def build_invoice(info, sheet_data, shared):
+            shipping_calculator_table, product_catalog = sheet_data
+            with timed('match', info['sheet_name']):
+                sheet_invoice = build_sheet_invoice(info, shipping_calculator_table, product_catalog, shared['fba_shipment_details_index'], fba_batches, fba_ledger, reference_numbers, sheet_profiles[info['sheet_name']])
+            # 重新分配的sheet页只扣减FBA批次，不生成发票
+            return None if info['sheet_name'] in replay_sheet_names else sheet_invoice
+
+        def sync_catalog():
+            with timed('catalog'):
+                return sync_product_catalog_cache(config.multidimensional_table_token, config.multidimensional_table_id, config.product_catalog_cache_path)
+
+        shared_fetchers = {
+            'fba_shipment_details_index': lambda: get_fba_shipment_details_index(config.fba_shipment_details_table_id, config.fba_shipment_details_table_range),
+            'product_catalog_cache': sync_catalog
+        }
+        def write_invoice(sheet_invoice):
+            invoice_file_path = wait_sheet_invoice(write_sheet_invoice(sheet_invoice, render_pool, manifests, force, shipment_addresses), manifests)
+            if invoice_file_path is not None:
+                invoice_files.append(invoice_file_path)
+                if on_invoice is not None:
+                    on_invoice(invoice_file_path)
+
+        # 按sheet页原来的顺序处理，FBA批次的分配顺序与生成整期发票时相同
+        target_sheets_info = [info for info in sheets_info if info['sheet_name'] in sheet_profiles]
+        asyncio.run(run_sheets_concurrently(target_sheets_info, shared_fetchers, fetch_sheet, resolve_sheet, build_invoice, write_invoice, max_concurrency))
+
+    finally:
+        if render_pool is not None:
+            render_pool.shutdown()
+        finish_run_report(report, config.run_report_dir)
+    return invoice_files
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+from invoice_engine.metrics import timed
+from invoice_engine.sheets import get_sheet_values
+
+
+def download_fba_shipment_details(spreadsheet_id, range_):
+    '''下载FBA货件明细云表格全部数据'''
+    return get_sheet_values(spreadsheet_id, range_)
+
+
+def build_fba_shipment_details_index(values):
+    '''按(M-SKU, 亚马逊仓库代码)为FBA货件明细建立哈希索引，M-SKU在第8列(H)，仓库代码在第5列(E)'''
+    index = defaultdict(list)
+    for row in values:
+        if len(row) < 9:
+            continue
+        index[(row[7], row[4])].append(row)
+    return index
+
+
+def get_fba_shipment_details_index(spreadsheet_id, range_):
+    '''每次运行只下载一次FBA货件明细表，之后所有查找都走索引'''
+    with timed('fba'):
+        values = download_fba_shipment_details(spreadsheet_id, range_)
+        return build_fba_shipment_details_index(values)
+
+
+def get_check_col(sheet_title, profile):
+    '''按sheet页名称（parse_sheet_title的结果）中的运输方式确定FBA货件明细中用于判断是否已发货的列'''
+    for keywords, check_col in profile['check_col_rules']:
+        if any(keyword in sheet_title['services'] for keyword in keywords):
+            return check_col
+    print('出现新的运输情况，请与仓库确认属于三种的哪种情况', sheet_title['sheet_name'])
+    raise ValueError(f"无法确定运输方式: {sheet_title['sheet_name']}")
+
+
+def find_exact_batches(quantities, demand):
+    '''
+    子集和：在各批数量中找出总和正好等于demand的组合，有单独一批正好等于demand时只用这一批
+    可达总和用整数的二进制位表示，每批只需一次移位，分批再多也只需毫秒级
+    :return: 组合中各批的下标，找不到时返回None
+    '''
+    for idx, quantity in enumerate(quantities):
+        if quantity == demand:
+            return [idx]
+    mask = (1 << (demand + 1)) - 1
+    # reachable[i]：只用前i批能凑出的总和
+    reachable = [1]
+    for quantity in quantities:
+        reachable.append((reachable[-1] | (reachable[-1] << quantity)) & mask if quantity > 0 else reachable[-1])
+    if not (reachable[-1] >> demand) & 1:
+        return None
+    # 从后往前回溯：不用第i批也能凑出时跳过该批，否则该批必须使用
+    combo = []
+    total = demand
+    for idx in range(len(quantities) - 1, -1, -1):
+        if total == 0:
+            break
+        if not (reachable[idx] >> total) & 1:
+            combo.append(idx)
+            total -= quantities[idx]
+    return sorted(combo)
+
+
+def allocate_fba_batches(batches, remaining, demand):
+    '''
+    从同一(货代, M-SKU, 仓库)的各批货件中分配demand件并扣减各批剩余数量
+    优先用尚未动用的整批正好凑出demand；凑不出时按表格顺序从有剩余的批次中依次扣减
+    :param remaining: 各批尚未分配的数量，与batches一一对应，分配后就地扣减
+    :return: [(批次, 本行使用数量)]，剩余总量不足时返回None
+    '''
+    if demand > 0:
+        untouched = [idx for idx, batch in enumerate(batches) if remaining[idx] == batch['Declared_quantity']]
+        exact = find_exact_batches([remaining[idx] for idx in untouched], demand)
+        if exact is not None:
+            allocation = []
+            for idx in (untouched[i] for i in exact):
+                allocation.append((batches[idx], remaining[idx]))
+                remaining[idx] = 0
+            return allocation
+
+    if sum(remaining) < demand or not batches:
+        return None
+    allocation = []
+    left = demand
+    for idx, batch in enumerate(batches):
+        if left <= 0:
+            break
+        used = min(remaining[idx], left)
+        if used > 0:
+            remaining[idx] -= used
+            allocation.append((batch, used))
+            left -= used
+    if not allocation:
+        # 申报量为0时仍按第一批显示
+        allocation.append((batches[0], 0))
+    return allocation
+
+
+def get_fba_batches(fba_shipment_details_index, M_SKU, amazon_warehouse_code, check_col):
+    '''从FBA货件明细索引中按表格顺序取出判断列有值（已发货）的各批货件'''
+    return [
+        {
+            "ShipmentID": row[0],
+            "ReferenceID": row[1],
+            "Declared_quantity": int(row[8]),
+            "Amazon_warehouse_code": row[4],
+            "M_SKU": row[7],
+            "check_col": check_col
+        }
+        for row in fba_shipment_details_index.get((M_SKU, amazon_warehouse_code), [])
+        if row[check_col] is not None
+    ]
+
+
+def get_fba_shipment_details_table(fba_shipment_details_index, fba_batches, fba_ledger, amazon_warehouse_code, sheet_title, declaration_quantity, M_SKU, profile):
+    '''
+    支持分批发货记录的匹配：为一行发票分配FBA货件批次，返回[货件明细]，找不到或数量不足时返回空列表
+    每行发票只占一行货件明细，显示所用第一批的ShipmentID和ReferenceID，申报数量为本行数量，batches中记录本行用到的各批及数量
+    :param fba_batches: 本次运行的RunCache，缓存各组筛选好的批次，被淘汰后重新筛选
+    :param fba_ledger: 本次运行的分配记录{组: 各批剩余数量}，不会被淘汰，由调用方每次运行新建
+    :param sheet_title: sheet页名称的解析结果，按其中的运输方式确定判断列
+    '''
+    # 同一仓库不同运输方式判断是否已发货的列不同，有效批次也不同
+    check_col = get_check_col(sheet_title, profile)
+    # 各货代的分批使用量分开统计；没有已发货批次的组合同样缓存，不再重复筛选
+    cache_key = (profile['name'], M_SKU, amazon_warehouse_code, check_col)
+    batches = fba_batches.get_or_load(cache_key, lambda: get_fba_batches(fba_shipment_details_index, M_SKU, amazon_warehouse_code, check_col))
+    # 剩余数量不放在可淘汰的缓存中：批次列表被淘汰后按同样顺序重新筛选，已分配的数量仍然有效，不会重复分配同一批
+    # 每一期单独分配（与生成整期发票时相同），指定不同日期的sheet页一起生成时互不影响
+    remaining = fba_ledger.setdefault((sheet_title['date'], *cache_key), [batch['Declared_quantity'] for batch in batches])
+    current_qty = int(declaration_quantity)
+    allocation = allocate_fba_batches(batches, remaining, current_qty)
+    if allocation is None:
+        if batches:
+            print(f"FBA货件明细剩余数量不足: {M_SKU}, {amazon_warehouse_code}, 需要{current_qty}, 剩余{sum(remaining)}")
+        return []
+
+    first_batch = allocation[0][0]
+    return [{
+        "ShipmentID": first_batch["ShipmentID"],
+        "ReferenceID": first_batch["ReferenceID"],
+        "Declared_quantity": current_qty,
+        "Amazon_warehouse_code": first_batch["Amazon_warehouse_code"],
+        "M_SKU": first_batch["M_SKU"],
+        "check_col": check_col,
+        "batches": [
+            {"ShipmentID": batch["ShipmentID"], "ReferenceID": batch["ReferenceID"], "quantity": used}
+            for batch, used in allocation
+        ]
+    }]
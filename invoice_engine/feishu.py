@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from invoice_engine.metrics import record_request, timed
+
+app_id = 'xx'  # 飞书应用app_id
+app_secret = 'xx'  # 飞书应用app_secret
+# 凭证到期前提前刷新的秒数，避免请求发出时凭证刚好过期
+token_refresh_ahead_seconds = 300
+
+pool_size = 10  # 连接池大小，并发请求多时可调大
+max_retries = 5  # 429、5xx、网络异常的最大重试次数
+backoff_base_seconds = 0.5  # 指数退避的初始等待秒数
+backoff_max_seconds = 30  # 单次退避的最长等待秒数
+request_timeout = (5, 60)  # 每次请求的(连接, 读取)超时秒数
+# 飞书凭证失效的错误码，遇到后刷新凭证再重试
+invalid_token_codes = {99991661, 99991663, 99991668}
+# 飞书频率限制的错误码
+rate_limit_codes = {99991400}
+
+_token_lock = threading.Lock()
+_token_cache = {
+    'tenant_access_token': None,
+    'expire_at': 0
+}
+_session_lock = threading.Lock()
+_session = None
+
+
+def fetch_tenant_access_token():
+    '''向飞书获取新的访问凭证，返回(凭证, 有效秒数)'''
+    url = 'https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal'
+    data = {
+        "app_id": app_id,
+        "app_secret": app_secret
+    }
+    with timed('token'):
+        ret = feishu_request('POST', url, auth=False, data=json.dumps(data, ensure_ascii=False))
+    data = ret.json()
+    if data.get('code') != 0:
+        raise RuntimeError(f"获取访问凭证失败: {data.get('msg')}")
+    return data.get("tenant_access_token"), data.get("expire", 0)
+
+
+def get_tenant_access_token(force_refresh=False):
+    '''获取访问凭证：首次使用时才请求，之后复用缓存，临近过期时加锁刷新'''
+    if not force_refresh and time.time() < _token_cache['expire_at']:
+        return _token_cache['tenant_access_token']
+    with _token_lock:
+        # 等锁期间可能已被其他线程刷新
+        if not force_refresh and time.time() < _token_cache['expire_at']:
+            return _token_cache['tenant_access_token']
+        tenant_access_token, expire = fetch_tenant_access_token()
+        _token_cache['tenant_access_token'] = tenant_access_token
+        _token_cache['expire_at'] = time.time() + max(expire - token_refresh_ahead_seconds, 0)
+        return tenant_access_token
+
+
+def invalidate_tenant_access_token():
+    '''凭证被飞书判定失效时调用，下次请求会重新获取'''
+    with _token_lock:
+        _token_cache['expire_at'] = 0
+
+
+def get_headers():
+    '''所有飞书接口共用的请求头，每次调用都会带上当前有效的凭证'''
+    return {
+        "Authorization": f"Bearer {get_tenant_access_token()}",
+        "Content-Type": "application/json"
+    }
+
+
+def get_session():
+    '''所有飞书请求共用的连接池会话，复用TLS连接'''
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def get_retry_wait_seconds(response, attempt):
+    '''计算重试前的等待时间：优先使用飞书频率限制响应头，否则指数退避加随机抖动'''
+    if response is not None:
+        for header in ('x-ogw-ratelimit-reset', 'Retry-After'):
+            value = response.headers.get(header)
+            if value:
+                try:
+                    return min(float(value), backoff_max_seconds) + random.uniform(0, backoff_base_seconds)
+                except ValueError:
+                    pass
+    return random.uniform(0, min(backoff_base_seconds * 2 ** attempt, backoff_max_seconds))
+
+
+def get_error_code(response):
+    '''读取飞书错误响应中的code，非JSON响应返回None'''
+    try:
+        return response.json().get('code')
+    except ValueError:
+        return None
+
+
+def feishu_request(method, url, auth=True, **kwargs):
+    '''
+    通过共用连接池发送飞书请求，429、5xx、频率限制和网络异常时自动退避重试
+    :param auth: 是否带上访问凭证请求头，下载临时链接等无需凭证的请求传False
+    :return: requests.Response
+    '''
+    kwargs.setdefault('timeout', request_timeout)
+    extra_headers = kwargs.pop('headers', None) or {}
+    token_refreshed = False
+    attempt = 0
+    while True:
+        headers = {**get_headers(), **extra_headers} if auth else extra_headers
+        response = None
+        start = time.perf_counter()
+        try:
+            response = get_session().request(method, url, headers=headers, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            record_request(url, time.perf_counter() - start, 0, True)
+            if attempt >= max_retries:
+                raise
+            print(f"请求飞书接口异常，第{attempt + 1}次重试: {url}, {str(e)}")
+        else:
+            status_code = response.status_code
+            # 每次请求（包括重试）都计入运行报告
+            record_request(url, time.perf_counter() - start, len(response.content), status_code >= 400)
+            if status_code < 400:
+                return response
+            error_code = get_error_code(response) if status_code < 500 else None
+            if auth and error_code in invalid_token_codes and not token_refreshed:
+                # 凭证失效立即刷新重试，不计入重试次数
+                invalidate_tenant_access_token()
+                token_refreshed = True
+                continue
+            if not (status_code == 429 or status_code >= 500 or error_code in rate_limit_codes) or attempt >= max_retries:
+                return response
+            print(f"飞书接口返回{status_code}，第{attempt + 1}次重试: {url}")
+        time.sleep(get_retry_wait_seconds(response, attempt))
+        attempt += 1
+
+
+def feishu_get(url, **kwargs):
+    return feishu_request('GET', url, **kwargs)
+
+
+def feishu_post(url, **kwargs):
+    return feishu_request('POST', url, **kwargs)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import tempfile
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image as PILImage
+from invoice_engine.feishu import feishu_get
+
+# 获取临时下载链接接口每次最多传入的file_token数
+max_file_tokens_per_request = 5
+# 并发下载图片的线程数
+download_workers = 8
+# 缩略图重新压缩的JPEG质量
+thumbnail_quality = 85
+
+
+def get_cached_image_path(cache_dir, file_token):
+    '''图片缓存按file_token命名，同一张图片无论被多少张发票、多少期使用都只下载一次'''
+    return os.path.join(cache_dir, f'{file_token}.jpg')
+
+
+def get_tmp_download_urls(file_tokens):
+    '''批量获取图片的临时下载链接，返回{file_token: 临时下载链接}'''
+    url = "https://open.feishu.cn/open-apis/drive/v1/medias/batch_get_tmp_download_url"
+    tmp_download_urls = {}
+    for i in range(0, len(file_tokens), max_file_tokens_per_request):
+        params = {
+            "file_tokens": file_tokens[i:i + max_file_tokens_per_request]
+        }
+        response = feishu_get(url, params=params)
+        data = response.json()
+        if data.get('code') != 0:
+            print(f"获取图片临时下载链接失败: {data.get('msg')}")
+            continue
+        for item in data.get('data', {}).get('tmp_download_urls', []):
+            tmp_download_urls[item.get('file_token')] = item.get('tmp_download_url')
+    return tmp_download_urls
+
+
+def download_image(tmp_download_url, img_path):
+    '''
+    下载单张图片，先写临时文件再改名，避免中断或多个线程同时下载时留下不完整的缓存
+    链接过期、无权限等返回的错误内容不是图片，直接抛出异常，不写入缓存
+    '''
+    res = feishu_get(tmp_download_url, auth=False)
+    res.raise_for_status()
+    with PILImage.open(io.BytesIO(res.content)) as img:
+        img.verify()
+    with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(img_path), suffix='.part', delete=False) as f:
+        try:
+            f.write(res.content)
+        except Exception:
+            f.close()
+            os.remove(f.name)
+            raise
+    os.replace(f.name, img_path)
+
+
+def fetch_images(file_tokens, cache_dir):
+    '''
+    获取一批产品图片：已缓存的直接使用，未缓存的批量获取下载链接后并发下载
+    :return: {file_token: 本地图片路径}，下载失败的图片不在结果中
+    '''
+    os.makedirs(cache_dir, exist_ok=True)
+    image_paths = {}
+    missing_tokens = []
+    unique_tokens = list(dict.fromkeys(token for token in file_tokens if token))
+    for file_token in unique_tokens:
+        img_path = get_cached_image_path(cache_dir, file_token)
+        if os.path.isfile(img_path):
+            image_paths[file_token] = img_path
+        else:
+            missing_tokens.append(file_token)
+    if not missing_tokens:
+        return image_paths
+    cached_count = len(image_paths)
+
+    tmp_download_urls = get_tmp_download_urls(missing_tokens)
+
+    def download(file_token):
+        img_path = get_cached_image_path(cache_dir, file_token)
+        try:
+            download_image(tmp_download_urls[file_token], img_path)
+            return file_token, img_path
+        except Exception as e:
+            print(f"下载图片 {file_token} 时出错: {str(e)}")
+            return file_token, None
+
+    with ThreadPoolExecutor(max_workers=download_workers) as executor:
+        # 每个下载任务复制一份当前上下文，下载请求计入本次运行的报告
+        futures = [executor.submit(contextvars.copy_context().run, download, token) for token in missing_tokens if tmp_download_urls.get(token)]
+        for future in futures:
+            file_token, img_path = future.result()
+            if img_path:
+                image_paths[file_token] = img_path
+    print(f"产品图片：共{len(unique_tokens)}张，缓存命中{cached_count}张，新下载{len(image_paths) - cached_count}张")
+    return image_paths
+
+
+def get_thumbnail(file_token, img_path, size, cache_dir):
+    '''
+    将原图缩放到发票单元格的像素大小并重新压缩，避免把几MB的原图嵌进发票
+    缩略图按(file_token, 尺寸)缓存在cache_dir/缩略图下，同尺寸的单元格直接复用
+    :param size: (宽, 高)像素
+    :return: 缩略图路径，处理失败时返回原图路径
+    '''
+    width, height = (max(int(round(value)), 1) for value in size)
+    thumbnail_dir = os.path.join(cache_dir, '缩略图')
+    thumbnail_path = os.path.join(thumbnail_dir, f'{file_token}_{width}x{height}.jpg')
+    if os.path.isfile(thumbnail_path):
+        return thumbnail_path
+    try:
+        os.makedirs(thumbnail_dir, exist_ok=True)
+        with PILImage.open(img_path) as img:
+            # 发票中图片按单元格大小拉伸显示，缩略图保持同样的宽高
+            thumbnail = img.convert('RGB').resize((width, height), PILImage.LANCZOS)
+        with tempfile.NamedTemporaryFile('wb', dir=thumbnail_dir, suffix='.part', delete=False) as f:
+            thumbnail.save(f, 'JPEG', quality=thumbnail_quality, optimize=True)
+        os.replace(f.name, thumbnail_path)
+        return thumbnail_path
+    except Exception as e:
+        print(f"生成图片 {file_token} 缩略图时出错: {str(e)}")
+        return img_path
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+'''
+发票生成任务队列：HTTP接口只登记任务并立即返回任务id，任务在后台线程中按顺序执行
+同样的任务（货代、日期、sheet页都相同）已在排队或运行时直接返回该任务，多人同时点击不会重复跑整批发票
+'''
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from invoice_engine import config, engine
+from invoice_engine.metrics import RunReport
+
+_job_lock = threading.Lock()
+_job_executor = ThreadPoolExecutor(max_workers=config.job_workers)
+# {任务id: 任务信息}，按登记顺序排列
+_jobs = {}
+# {任务参数: 排队或运行中的任务id}
+_active_jobs = {}
+
+
+def get_job_key(forwarder_names, current_date, sheet_names, force):
+    '''货代集合、日期、sheet页集合和是否强制重新生成都相同的任务视为同一个任务'''
+    return (
+        None if forwarder_names is None else tuple(sorted(forwarder_names)),
+        current_date,
+        None if sheet_names is None else tuple(sorted(sheet_names)),
+        force
+    )
+
+
+def prune_jobs():
+    '''只保留最近max_kept_jobs个任务的记录，排队或运行中的任务不清理'''
+    finished_job_ids = [job_id for job_id, job in _jobs.items() if is_job_done(job)]
+    for job_id in finished_job_ids[:max(len(_jobs) - config.max_kept_jobs, 0)]:
+        del _jobs[job_id]
+
+
+def run_job(job_id, job_key):
+    '''在后台线程中执行一个生成任务，每生成一张发票就追加到任务的发票列表，供边生成边下载'''
+    job = _jobs[job_id]
+    job['status'] = 'running'
+    job['started_at'] = time.time()
+    # 运行中也可以查看已记录的耗时和接口调用
+    job['report'] = RunReport()
+    try:
+        engine.run(job['forwarder_names'], job['current_date'], job['sheet_names'], on_invoice=job['invoice_files'].append, force=job['force'], report=job['report'])
+        job['status'] = 'finished'
+    except Exception as e:
+        print(f"发票生成任务 {job_id} 出错: {str(e)}")
+        job['error'] = str(e)
+        job['status'] = 'failed'
+    finally:
+        job['finished_at'] = time.time()
+        with _job_lock:
+            _active_jobs.pop(job_key, None)
+            prune_jobs()
+
+
+def submit_job(forwarder_names=None, current_date=None, sheet_names=None, force=False):
+    '''
+    登记一个发票生成任务，同样的任务已在排队或运行时不再新建
+    参数同engine.run：forwarder_names货代，current_date日期，sheet_names指定sheet页，None表示不限；force忽略发票生成记录全部重新生成
+    :return: 任务信息
+    '''
+    job_key = get_job_key(forwarder_names, current_date, sheet_names, force)
+    with _job_lock:
+        job_id = _active_jobs.get(job_key)
+        if job_id is not None:
+            return _jobs[job_id]
+        job_id = uuid.uuid4().hex
+        _jobs[job_id] = {
+            'job_id': job_id,
+            'status': 'queued',
+            'forwarder_names': forwarder_names,
+            'current_date': current_date,
+            'sheet_names': sheet_names,
+            'force': force,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'invoice_files': [],
+            'report': None,
+            'error': None
+        }
+        _active_jobs[job_key] = job_id
+        _job_executor.submit(run_job, job_id, job_key)
+        return _jobs[job_id]
+
+
+def is_job_done(job):
+    return job['status'] in ('finished', 'failed')
+
+
+def get_job(job_id):
+    '''返回任务信息，任务不存在（或已被清理）时返回None'''
+    return _jobs.get(job_id)
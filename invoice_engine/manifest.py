@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+'''
+发票生成记录：每个货代的保存目录下记录每张发票生成时输入数据的哈希
+输入数据包括运费计算器数据、匹配到的产品信息和FBA货件明细、发票编号、收货地址，以及模板文件和货代配置
+重新运行时输入没有变化且发票文件还在的sheet页直接沿用已有发票，只重新生成有变化的sheet页
+'''
+import os
+import json
+import time
+import hashlib
+import threading
+
+manifest_file_name = '发票生成记录.json'
+# sheet_invoice中的本地文件路径，不参与哈希
+local_path_keys = ('image_paths',)
+
+_manifest_lock = threading.Lock()
+# {(模板路径, 修改时间, 文件大小): 模板文件哈希}
+_template_hashes = {}
+
+
+def get_file_hash(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(data)
+    return sha256.hexdigest()
+
+
+def get_template_hash(template_path):
+    '''模板文件的哈希，模板没有修改时不重复读取'''
+    stat = os.stat(template_path)
+    key = (template_path, stat.st_mtime_ns, stat.st_size)
+    if key not in _template_hashes:
+        _template_hashes[key] = get_file_hash(template_path)
+    return _template_hashes[key]
+
+
+def get_inputs_hash(sheet_invoice, profile):
+    '''
+    一张发票全部输入的哈希：build_sheet_invoice的结果（已包含运费计算器数据、产品信息、FBA货件明细和发票编号）、
+    preparer补充的内容（如盈和的收货地址）、模板文件和货代配置
+    本地图片路径不参与哈希（图片由产品信息中的file_token确定），货代配置中的函数也不参与（其表示中含有内存地址，每次运行都不同）
+    '''
+    inputs = {
+        'sheet_invoice': {key: value for key, value in sheet_invoice.items() if key not in local_path_keys},
+        'template': get_template_hash(profile['template_path']),
+        'profile': {key: value for key, value in profile.items() if not callable(value)}
+    }
+    data = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def load_manifest(save_path):
+    '''读取保存目录下的发票生成记录，不存在或无法解析时返回空记录'''
+    manifest_path = os.path.join(save_path, manifest_file_name)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"读取发票生成记录时出错，本次全部重新生成: {str(e)}")
+        return {}
+
+
+def save_manifest(save_path, manifest):
+    '''先写临时文件再替换，中途出错不会留下写了一半的记录'''
+    os.makedirs(save_path, exist_ok=True)
+    manifest_path = os.path.join(save_path, manifest_file_name)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def get_manifest(manifests, save_path):
+    '''本次运行中每个保存目录的记录只读取一次，manifests为{保存目录: 记录}'''
+    if save_path not in manifests:
+        manifests[save_path] = load_manifest(save_path)
+    return manifests[save_path]
+
+
+def is_invoice_unchanged(manifests, save_path, sheet_name, inputs_hash, invoice_file_path):
+    '''sheet页的输入和上次生成时相同，并且上次生成的发票文件还在'''
+    with _manifest_lock:
+        entry = get_manifest(manifests, save_path).get(sheet_name)
+    return (
+        entry is not None
+        and entry['inputs_hash'] == inputs_hash
+        and entry['invoice_file'] == os.path.basename(invoice_file_path)
+        and os.path.exists(invoice_file_path)
+    )
+
+
+def record_invoice(manifests, save_path, sheet_name, inputs_hash, invoice_file_path):
+    '''发票生成成功后立即更新记录，运行中途出错时已生成的发票下次也能沿用'''
+    with _manifest_lock:
+        manifest = get_manifest(manifests, save_path)
+        manifest[sheet_name] = {
+            'inputs_hash': inputs_hash,
+            'invoice_file': os.path.basename(invoice_file_path),
+            'generated_at': time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        save_manifest(save_path, manifest)
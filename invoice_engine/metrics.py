@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+'''
+运行报告：记录一次运行中各阶段的耗时、各飞书接口的调用次数和下载字节数、每个sheet页各阶段的耗时，运行结束后保存为JSON
+当前运行的报告放在contextvars中，asyncio.to_thread等复制了上下文的线程中的记录也会计入；没有进行中的运行时记录函数不做任何事
+安装了prometheus_client时，每次运行结束后同时累加到Prometheus指标，由HTTP接口的/metrics输出
+'''
+import os
+import re
+import json
+import time
+import uuid
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+_current_report = contextvars.ContextVar('run_report', default=None)
+
+# (接口名称, URL正则)，按顺序匹配，URL中的表格id、range等不计入接口名称
+endpoint_patterns = [
+    ('auth.tenant_access_token', re.compile(r'/auth/v3/tenant_access_token/')),
+    ('sheets.query', re.compile(r'/sheets/v3/spreadsheets/[^/]+/sheets/query')),
+    ('sheets.values', re.compile(r'/sheets/v2/spreadsheets/[^/]+/values/')),
+    ('bitable.records.search', re.compile(r'/bitable/v1/apps/[^/]+/tables/[^/]+/records/search')),
+    ('drive.tmp_download_url', re.compile(r'/drive/v1/medias/batch_get_tmp_download_url')),
+]
+
+
+def get_endpoint_name(url):
+    '''飞书接口按endpoint_patterns归类，其他地址（如图片临时下载链接）按域名归类'''
+    for name, pattern in endpoint_patterns:
+        if pattern.search(url):
+            return name
+    return urlsplit(url).netloc or url
+
+
+class RunReport:
+    def __init__(self):
+        self.run_id = uuid.uuid4().hex
+        self.started_at = time.time()
+        self.finished_at = None
+        self.stages = defaultdict(lambda: {'count': 0, 'seconds': 0.0})  # {阶段: 次数和累计秒数}
+        self.endpoints = defaultdict(lambda: {'calls': 0, 'errors': 0, 'bytes': 0, 'seconds': 0.0})  # {接口: 调用统计}
+        self.sheets = defaultdict(lambda: defaultdict(float))  # {sheet页: {阶段: 秒数}}
+        self._lock = threading.Lock()
+        self._token = None
+
+    def add_stage(self, stage, seconds, sheet_name=None):
+        with self._lock:
+            self.stages[stage]['count'] += 1
+            self.stages[stage]['seconds'] += seconds
+            if sheet_name is not None:
+                self.sheets[sheet_name][stage] += seconds
+
+    def add_request(self, endpoint, seconds, size, error):
+        with self._lock:
+            stats = self.endpoints[endpoint]
+            stats['calls'] += 1
+            stats['errors'] += 1 if error else 0
+            stats['bytes'] += size
+            stats['seconds'] += seconds
+
+    def to_dict(self):
+        with self._lock:
+            finished_at = self.finished_at or time.time()
+            return {
+                'run_id': self.run_id,
+                'started_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at)),
+                'seconds': round(finished_at - self.started_at, 3),
+                'stages': {stage: {'count': stats['count'], 'seconds': round(stats['seconds'], 3)} for stage, stats in self.stages.items()},
+                'endpoints': {endpoint: dict(stats, seconds=round(stats['seconds'], 3)) for endpoint, stats in self.endpoints.items()},
+                'sheets': {
+                    sheet_name: dict({stage: round(seconds, 3) for stage, seconds in stages.items()}, seconds=round(sum(stages.values()), 3))
+                    for sheet_name, stages in self.sheets.items()
+                }
+            }
+
+    def save(self, report_dir):
+        '''保存为report_dir下的JSON文件，返回文件路径'''
+        os.makedirs(report_dir, exist_ok=True)
+        report_path = os.path.join(report_dir, f"运行报告_{time.strftime('%Y%m%d_%H%M%S', time.localtime(self.started_at))}_{self.run_id[:8]}.json")
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        return report_path
+
+
+def start_run_report(report=None):
+    '''开始记录一次运行，之后本上下文中的记录都计入该报告；report为None时新建'''
+    report = report or RunReport()
+    report._token = _current_report.set(report)
+    return report
+
+
+def finish_run_report(report, report_dir=None):
+    '''结束记录：累加Prometheus指标，report_dir不为None时保存JSON报告'''
+    report.finished_at = time.time()
+    if report._token is not None:
+        _current_report.reset(report._token)
+        report._token = None
+    export_prometheus(report)
+    if report_dir is not None:
+        try:
+            print(f"运行报告已保存: {report.save(report_dir)}")
+        except Exception as e:
+            print(f"保存运行报告时出错: {str(e)}")
+
+
+def record_stage(stage, seconds, sheet_name=None):
+    report = _current_report.get()
+    if report is not None:
+        report.add_stage(stage, seconds, sheet_name)
+
+
+def record_request(url, seconds, size, error):
+    report = _current_report.get()
+    if report is not None:
+        report.add_request(get_endpoint_name(url), seconds, size, error)
+
+
+@contextmanager
+def timed(stage, sheet_name=None):
+    '''记录with块的耗时，出错时同样记录'''
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start, sheet_name)
+
+
+if prometheus_client is not None:
+    prometheus_runs = prometheus_client.Counter('invoice_runs_total', '发票生成运行次数')
+    prometheus_run_seconds = prometheus_client.Histogram('invoice_run_seconds', '每次运行的总耗时')
+    prometheus_stage_seconds = prometheus_client.Counter('invoice_stage_seconds_total', '各阶段累计耗时', ['stage'])
+    prometheus_sheet_seconds = prometheus_client.Histogram('invoice_sheet_seconds', '每个sheet页各阶段合计耗时', buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300))
+    prometheus_requests = prometheus_client.Counter('feishu_requests_total', '飞书接口调用次数', ['endpoint'])
+    prometheus_request_errors = prometheus_client.Counter('feishu_request_errors_total', '飞书接口失败次数（含重试）', ['endpoint'])
+    prometheus_response_bytes = prometheus_client.Counter('feishu_response_bytes_total', '飞书接口下载字节数', ['endpoint'])
+
+
+def export_prometheus(report):
+    '''把一次运行的报告累加到Prometheus指标，未安装prometheus_client时不做任何事'''
+    if prometheus_client is None:
+        return
+    data = report.to_dict()
+    prometheus_runs.inc()
+    prometheus_run_seconds.observe(data['seconds'])
+    for stage, stats in data['stages'].items():
+        prometheus_stage_seconds.labels(stage=stage).inc(stats['seconds'])
+    for sheet in data['sheets'].values():
+        prometheus_sheet_seconds.observe(sheet['seconds'])
+    for endpoint, stats in data['endpoints'].items():
+        prometheus_requests.labels(endpoint=endpoint).inc(stats['calls'])
+        prometheus_request_errors.labels(endpoint=endpoint).inc(stats['errors'])
+        prometheus_response_bytes.labels(endpoint=endpoint).inc(stats['bytes'])
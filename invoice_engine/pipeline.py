@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+
+async def run_sheets_concurrently(sheets_info, shared_fetchers, fetch_sheet, resolve_sheet, build_invoice, write_invoice, max_concurrency=8):
+    '''
+    并发处理多个sheet页：网络请求和写文件在线程中并发执行，同时运行的任务数受max_concurrency限制
+    :param sheets_info: 需要处理的sheet页信息列表
+    :param shared_fetchers: 所有sheet页共用的数据，{名称: 无参函数}，如FBA货件明细索引
+    :param fetch_sheet: fetch_sheet(info) -> sheet页数据，所有sheet页一开始就并发下载
+    :param resolve_sheet: resolve_sheet(info, sheet页数据, shared) -> sheet页数据，共用数据到齐后执行，如查询产品信息
+    :param build_invoice: build_invoice(info, sheet页数据, shared) -> 发票数据，按sheet页顺序逐个执行，保证FBA分批匹配结果稳定；返回None时不写入发票
+    :param write_invoice: write_invoice(发票数据)，每个sheet页数据齐全后立即写入发票
+    '''
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_in_thread(func, *args):
+        async with semaphore:
+            return await asyncio.to_thread(func, *args)
+
+    shared_tasks = {name: asyncio.create_task(run_in_thread(fetcher)) for name, fetcher in shared_fetchers.items()}
+
+    async def get_shared():
+        return {name: await task for name, task in shared_tasks.items()}
+
+    async def prepare_sheet(info):
+        sheet_data = await run_in_thread(fetch_sheet, info)
+        shared = await get_shared()
+        return await run_in_thread(resolve_sheet, info, sheet_data, shared)
+
+    sheet_tasks = [asyncio.create_task(prepare_sheet(info)) for info in sheets_info]
+    write_tasks = []
+    try:
+        shared = await get_shared()
+        for info, sheet_task in zip(sheets_info, sheet_tasks):
+            try:
+                sheet_data = await sheet_task
+                sheet_invoice = build_invoice(info, sheet_data, shared)
+                if sheet_invoice is None:
+                    continue
+                write_tasks.append((info, asyncio.create_task(run_in_thread(write_invoice, sheet_invoice))))
+            except Exception as e:
+                print(f"处理sheet {info['sheet_name']} 时出错: {str(e)}")
+        for info, write_task in write_tasks:
+            try:
+                await write_task
+            except Exception as e:
+                print(f"写入sheet {info['sheet_name']} 发票时出错: {str(e)}")
+    finally:
+        for task in [*shared_tasks.values(), *sheet_tasks]:
+            task.cancel()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+'''
+各货代发票的差异配置：sheet页筛选、运费计算器列布局、发货判断列、发票编号前缀、模板与保存地址、填写内容
+新增货代时在forwarder_profiles中加一项，并在writers.py中实现对应的layout函数
+layout在渲染进程中执行，只能做本地计算；需要访问网络的准备工作（下载图片、查询地址等）放在preparer中
+'''
+from invoice_engine.writers import get_weitu_invoice_layout, prepare_desu_invoice, get_desu_invoice_layout, prepare_yinghe_invoice, get_yinghe_invoice_layout
+
+forwarder_profiles = {
+    '为途': {
+        'name': '为途',
+        'sheet_keyword': '为途',  # sheet页名称中包含该关键字的属于该货代，同时用于发票编号计数和文件命名
+        'exclude_keywords': [],  # sheet页名称中包含这些关键字的不生成发票
+        'reference_prefix': 'LL1235',  # 发票编号前缀，完整编号为前缀+两位数月份+当月序号
+        'calculator': {
+            'row_length': 34,  # 产品行的列数
+            'required_columns': [0, 2, 3, 4, 5, 6],  # 这些列都有值才算产品行
+            'skip_header': True,  # 第一条产品行是表头
+            'columns': {'product_name': 0, 'product_set_number': 2, 'box_size': 3, 'product_box_num': 4, 'real_weight': 5}
+        },
+        # (运输方式关键字, FBA货件明细中判断是否已发货的列)，按顺序匹配
+        'check_col_rules': [
+            (('加班美森', '定提'), -2),
+            (('普船', '纽约卡派', '萨凡纳'), -3),
+            (('正班美森',), -1)
+        ],
+        'merge_columns': [4, 5, 6, 7],  # 同一箱的行合并D、E、F、G列
+        'preparer': None,  # 渲染前在当前进程执行的准备函数preparer(sheet_invoice, profile, shipment_addresses)
+        'layout': get_weitu_invoice_layout,  # 在渲染进程中生成发票的填写内容，由render.py写入模板
+        'template_path': r'D:\work\data\发票\三个发票模板\为途发票模板.xlsx', # 为途发票模版地址
+        'save_path': r'D:\work\data\发票\为途' # 为途生成发票保存地址
+    },
+    '德速': {
+        'name': '德速',
+        'sheet_keyword': '德速',
+        'exclude_keywords': [],
+        'reference_prefix': 'LL1235',
+        'calculator': {
+            'row_length': 33,
+            'required_columns': [0, 1, 2, 3, 4, 5, 6],
+            'skip_header': False,
+            'columns': {'product_name': 0, 'product_set_number': 1, 'box_size': 2, 'product_box_num': 3, 'real_weight': 4}
+        },
+        'check_col_rules': [
+            (('加班美森', '定提'), -2),
+            (('普船', '纽约卡派', '萨凡纳'), -3),
+            (('正班美森',), -1)
+        ],
+        'merge_columns': [1, 2, 3, 20, 21, 22, 23],  # 合并A、B、C、T、U、V、W列
+        'price_multiplier': 1.2,  # 申报价格倍数
+        'preparer': prepare_desu_invoice,
+        'layout': get_desu_invoice_layout,
+        'template_path': r'D:\work\data\发票\三个发票模板\德速发票模版.xlsx', # 德速发票模版地址
+        'save_path': r'D:\work\data\发票\德速', # 德速生成发票保存地址
+        'save_image_path': r'D:\work\data\发票\德速\产品图片' # 德速产品图片缓存地址，按file_token保存，各期发票共用
+    },
+    '盈和': {
+        'name': '盈和',
+        'sheet_keyword': '盈和',
+        'exclude_keywords': ['沃尔玛'],
+        'reference_prefix': 'G1235',
+        'calculator': {
+            'row_length': 33,
+            'required_columns': [0, 1, 2, 3, 4, 5, 6],
+            'skip_header': True,
+            'columns': {'product_name': 0, 'product_set_number': 1, 'box_size': 2, 'product_box_num': 3, 'real_weight': 9}
+        },
+        'check_col_rules': [
+            (('加班美森', '统配', '限时达'), -2),
+            (('普船',), -3),
+            (('正班美森',), -1)
+        ],
+        'merge_columns': [2],  # 合并B列
+        'preparer': prepare_yinghe_invoice,
+        'layout': get_yinghe_invoice_layout,
+        'template_path': r'D:\work\data\发票\三个发票模板\盈和发票模板.xlsx', # 盈和发票模版地址
+        'save_path': r'D:\work\data\发票\盈和' # 盈和生成发票保存地址
+    }
+}
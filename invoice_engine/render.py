@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from copy import copy
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.drawing.image import Image
+from openpyxl.styles import Border
+from openpyxl.utils import column_index_from_string
+from openpyxl.utils.cell import coordinate_from_string
+from openpyxl.worksheet.cell_range import CellRange, MultiCellRange
+from openpyxl.worksheet.dimensions import ColumnDimension, RowDimension
+from openpyxl.worksheet.merge import MergedCellRange
+from invoice_engine import config
+from invoice_engine.images import get_thumbnail
+from invoice_engine.templates import load_template
+from invoice_engine.writers import get_merge_ranges
+
+# 流式写入时与模板共用的样式表，模板单元格的样式下标在新工作簿中直接可用
+shared_style_tables = [
+    '_fonts', '_alignments', '_borders', '_fills', '_number_formats', '_date_formats', '_timedelta_formats',
+    '_protections', '_colors', '_cell_styles', '_named_styles', '_table_styles', '_differential_styles'
+]
+# 流式写入时原样复制的模板sheet页设置
+copied_sheet_settings = [
+    'sheet_properties', 'sheet_format', 'views', 'page_margins', 'page_setup', 'print_options', 'HeaderFooter',
+    'protection', 'auto_filter', 'row_breaks', 'col_breaks', 'data_validations', 'conditional_formatting', 'sheet_state'
+]
+
+
+def get_image_size(sheet, cell):
+    '''图片缩放到所在单元格的大小：列宽*7和行高（未设置行高按15）'''
+    column, row = coordinate_from_string(cell)
+    return sheet.column_dimensions[column].width * 7, sheet.row_dimensions[row].height or 15
+
+
+def get_image(layout, sheet, image):
+    '''生成缩放到单元格大小的图片对象'''
+    width, height = get_image_size(sheet, image['cell'])
+    img = Image(get_thumbnail(image['file_token'], image['path'], (width, height), layout['image_cache_dir']))
+    img.anchor = image['cell']
+    img.width = width
+    img.height = height
+    return img
+
+
+def fill_invoice(workbook, layout):
+    '''普通模式：把发票内容写入模板副本的当前sheet页'''
+    sheet = workbook.active
+    for coordinate, value in layout['header'].items():
+        sheet[coordinate] = value
+    for current_row, row in enumerate(layout['rows'], start=layout['start_row']):
+        for column, value in row.items():
+            sheet[f'{column}{current_row}'] = value
+    # 同一箱的合并区域一次加入：逐个merge_cells每次都要与已有的全部合并区域比较，区域多时耗时按平方增长
+    box_merges = [MergedCellRange(sheet, merge_range) for merge_range in get_merge_ranges(layout['start_row'], layout['box_numbers'], layout['merge_columns'])]
+    sheet.merged_cells = MultiCellRange([*sheet.merged_cells.ranges, *box_merges])
+    for merged_range in box_merges:
+        # 与merge_cells相同：除左上角外的单元格改为MergedCell，边缘单元格补上左上角单元格的边框
+        sheet._clean_merge_range(merged_range)
+    for image in layout['images']:
+        sheet.add_image(get_image(layout, sheet, image))
+
+
+def copy_sheet_layout(template_sheet, sheet):
+    '''复制模板sheet页的列宽、行高、打印设置、数据验证、条件格式和图片，必须在写入第一行之前完成'''
+    for name in copied_sheet_settings:
+        setattr(sheet, name, getattr(template_sheet, name))
+    for key, dimension in template_sheet.column_dimensions.items():
+        new_dimension = ColumnDimension(sheet, index=dimension.index, width=dimension.width, bestFit=dimension.bestFit,
+                                        hidden=dimension.hidden, outlineLevel=dimension.outlineLevel,
+                                        collapsed=dimension.collapsed, min=dimension.min, max=dimension.max)
+        new_dimension._style = copy(dimension._style)
+        sheet.column_dimensions[key] = new_dimension
+    for key, dimension in template_sheet.row_dimensions.items():
+        new_dimension = RowDimension(sheet, index=dimension.index, ht=dimension.ht, hidden=dimension.hidden,
+                                     outlineLevel=dimension.outlineLevel, collapsed=dimension.collapsed,
+                                     thickBot=dimension.thickBot, thickTop=dimension.thickTop)
+        new_dimension._style = copy(dimension._style)
+        sheet.row_dimensions[key] = new_dimension
+    for image in template_sheet._images:
+        sheet.add_image(image)
+    for chart in template_sheet._charts:
+        sheet.add_chart(chart)
+    if template_sheet.print_title_rows:
+        sheet.print_title_rows = template_sheet.print_title_rows
+    if template_sheet.print_title_cols:
+        sheet.print_title_cols = template_sheet.print_title_cols
+    if template_sheet.print_area:
+        sheet.print_area = template_sheet.print_area
+
+
+def get_box_merges(template_sheet, layout):
+    '''
+    同一箱的合并区域，按普通模式merge_cells的规则算出每个被合并单元格的边框：
+    左上角单元格补上右下角单元格的右边框和下边框；其余单元格清空内容和样式，位于区域边缘的沿用左上角单元格对应的边框
+    返回({(行, 列): 合并区域}, {合并区域左上角: 左上角边框})
+    '''
+    merged_cells = {}
+    start_borders = {}
+    for merge_range in get_merge_ranges(layout['start_row'], layout['box_numbers'], layout['merge_columns']):
+        cell_range = CellRange(merge_range)
+        start = template_sheet._cells.get((cell_range.min_row, cell_range.min_col))
+        end = template_sheet._cells.get((cell_range.max_row, cell_range.max_col))
+        # 左上角单元格不在模板中时，普通模式会新建一个默认样式的单元格
+        start_border = copy((start if start is not None else WriteOnlyCell(template_sheet)).border)
+        if end is not None:
+            start_border += Border(right=end.border.right, bottom=end.border.bottom)
+        start_borders[(cell_range.min_row, cell_range.min_col)] = start_border
+        for coordinate in cell_range.cells:
+            merged_cells[coordinate] = cell_range
+    return merged_cells, start_borders
+
+
+def get_merged_cell_border(cell, cell_range, row, column, start_border):
+    '''被合并单元格在普通模式下的边框：在单元格默认边框上叠加左上角单元格对应边缘的边框'''
+    border = copy(cell.border)
+    edges = {'top': row == cell_range.min_row, 'left': column == cell_range.min_col,
+             'right': column == cell_range.max_col, 'bottom': row == cell_range.max_row}
+    for name, on_edge in edges.items():
+        side = getattr(start_border, name)
+        if not on_edge or (side and side.style is None):
+            continue
+        border += Border(**{name: side})
+    return border
+
+
+def stream_sheet(template_sheet, sheet, layout):
+    '''流式模式：逐行生成 模板样式+模板内容+发票内容 的单元格并写出，写出后的行不再占用内存'''
+    header = {}
+    for coordinate, value in layout['header'].items():
+        column, row = coordinate_from_string(coordinate)
+        header[(row, column_index_from_string(column))] = value
+    start_row = layout['start_row']
+    merged_cells, start_borders = get_box_merges(template_sheet, layout)
+    max_column = max([template_sheet.max_column] + [column for row, column in header])
+    last_row = max([template_sheet.max_row, start_row + len(layout['box_numbers']) - 1] + [row for row, column in header])
+    template_cells = template_sheet._cells
+    rows = iter(layout['rows'])
+
+    for current_row in range(1, last_row + 1):
+        data = {}
+        if current_row >= start_row:
+            row_values = next(rows, {})
+            data = {column_index_from_string(column): value for column, value in row_values.items()}
+
+        cells = []
+        for column in range(1, max(max_column, max(data, default=0)) + 1):
+            source = template_cells.get((current_row, column))
+            value = source.value if source is not None else None
+            value = header.get((current_row, column), value)
+            value = data.get(column, value)
+            cell_range = merged_cells.get((current_row, column))
+
+            if cell_range is None or (current_row, column) == (cell_range.min_row, cell_range.min_col):
+                if source is None and value is None and cell_range is None:
+                    cells.append(None)
+                    continue
+                cell = WriteOnlyCell(sheet, value)
+                if source is not None:
+                    cell._style = copy(source._style)
+                    if source.comment is not None:
+                        cell.comment = copy(source.comment)
+                    if source.hyperlink is not None:
+                        cell.hyperlink = copy(source.hyperlink)
+                if cell_range is not None:
+                    cell.border = start_borders[(current_row, column)]
+            else:
+                # 合并区域中左上角以外的单元格
+                start_border = start_borders[(cell_range.min_row, cell_range.min_col)]
+                cell = WriteOnlyCell(sheet)
+                cell.border = get_merged_cell_border(cell, cell_range, current_row, column, start_border)
+                start = template_cells.get((cell_range.min_row, cell_range.min_col))
+                if start is not None:
+                    cell.protection = copy(start.protection)
+            cells.append(cell)
+        sheet.append(cells)
+
+    # 合并区域互不重叠，直接整体赋值（逐个add每次都要和已有区域比较，箱数多时很慢）
+    sheet.merged_cells = MultiCellRange([CellRange(merged_range.coord) for merged_range in template_sheet.merged_cells.ranges] + list(set(merged_cells.values())))
+    for image in layout['images']:
+        sheet.add_image(get_image(layout, template_sheet, image))
+
+
+def stream_invoice(template_path, layout, invoice_file_path):
+    '''
+    流式模式：用write_only工作簿逐行写出发票，内存占用不随产品行数增长，适合产品行很多的发票
+    模板的样式、列宽行高、合并单元格、打印设置等先复制到新工作簿，再按行叠加发票内容，生成的文件与普通模式一致
+    '''
+    template = load_template(template_path)
+    workbook = Workbook(write_only=True)
+    for name in shared_style_tables:
+        setattr(workbook, name, getattr(template, name))
+    workbook.loaded_theme = template.loaded_theme
+    workbook.defined_names = template.defined_names
+    empty_layout = {'header': {}, 'start_row': 1, 'rows': [], 'box_numbers': [], 'merge_columns': [], 'images': []}
+    for template_sheet in template.worksheets:
+        sheet = workbook.create_sheet(template_sheet.title)
+        copy_sheet_layout(template_sheet, sheet)
+        stream_sheet(template_sheet, sheet, layout if template_sheet is template.active else empty_layout)
+    workbook.active = template.worksheets.index(template.active)
+    workbook.save(invoice_file_path)
+
+
+def render_invoice(sheet_invoice, profile, invoice_file_path):
+    '''
+    在渲染进程中把发票数据写入模板并保存，只做本地计算，不访问网络
+    产品行数达到streaming_row_threshold时用流式模式写出，否则写入模板副本后保存
+    :return: 各步骤耗时{步骤: 秒数}，由主进程计入运行报告
+    '''
+    timings = {}
+    start = time.perf_counter()
+    layout = profile['layout'](sheet_invoice, sheet_invoice['reference_number'], profile)
+    threshold = config.streaming_row_threshold
+    if threshold is not None and len(sheet_invoice['product_info_list']) >= threshold:
+        # 流式模式边写边保存，填写和保存无法分开计时
+        stream_invoice(profile['template_path'], layout, invoice_file_path)
+        timings['render_stream'] = time.perf_counter() - start
+    else:
+        workbook = load_template(profile['template_path'])
+        fill_invoice(workbook, layout)
+        timings['render_fill'] = time.perf_counter() - start
+        start = time.perf_counter()
+        workbook.save(invoice_file_path)
+        timings['render_save'] = time.perf_counter() - start
+    return timings
+
+
+def create_render_pool():
+    '''
+    创建发票渲染进程池，进程数按CPU核数；render_processes为0时返回None，在当前进程渲染
+    渲染进程在第一次提交任务时才启动，此时下载线程已在运行，fork出的进程可能继承被其他线程占用的锁而卡死，
+    因此各平台都用spawn启动（与Windows默认相同）
+    '''
+    if config.render_processes == 0:
+        return None
+    return ProcessPoolExecutor(max_workers=config.render_processes or os.cpu_count(), mp_context=multiprocessing.get_context('spawn'))
+
+
+def submit_render(render_pool, sheet_invoice, profile, invoice_file_path):
+    '''把渲染任务放入进程池的任务队列，立即返回Future，不等渲染完成'''
+    if render_pool is not None:
+        return render_pool.submit(render_invoice, sheet_invoice, profile, invoice_file_path)
+    future = Future()
+    try:
+        future.set_result(render_invoice(sheet_invoice, profile, invoice_file_path))
+    except Exception as e:
+        future.set_exception(e)
+    return future
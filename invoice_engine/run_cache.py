@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+'''
+一次运行内使用的缓存：每次运行新建一个，显式传给需要的函数，运行结束即丢弃，不同运行之间互不影响
+条目数超过max_entries时淘汰最久未使用的条目，存入超过ttl秒的条目视为过期；查不到结果（None、空列表）同样缓存，不会反复查询
+'''
+import time
+import threading
+from collections import OrderedDict
+
+_missing = object()
+
+
+class RunCache:
+    def __init__(self, max_entries=None, ttl=None):
+        '''
+        :param max_entries: 最多保留的条目数，None表示不限
+        :param ttl: 条目有效秒数，None表示本次运行内一直有效
+        '''
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # {键: (存入时间, 值)}，按最近使用顺序排列
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key, _missing) is not _missing
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            stored_at, value = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            if self.max_entries is not None:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        '''缓存中没有（或已过期）时调用loader()取值并存入，loader的结果无论是否为空都会缓存'''
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
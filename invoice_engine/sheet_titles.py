@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+'''
+运费计算器sheet页名称解析，如'6.13为途加班美森ABE8已上传系统'：
+    date: 日期'6.13'，month: 名称开头的月份6（发票编号按月计数），warehouse_code: 日期之后的仓库代码'ABE8'
+    forwarder: 所属货代（按profiles中的顺序，含排除关键字的不属于该货代），services: 名称中的运输方式关键字
+    keywords: 名称中出现的全部关键字，uploaded: 已上传系统，weekly_summary: 一周汇总页
+货代、运输方式等关键字都取自forwarder_profiles，合成一个正则，每个名称只扫描一遍
+'''
+import re
+from invoice_engine.profiles import forwarder_profiles
+
+uploaded_keyword = '已上传系统'
+weekly_summary_keyword = '一周'
+
+date_pattern = re.compile(r'\d+\.\d+')
+month_pattern = re.compile(r'(\d+)\.')
+warehouse_code_pattern = re.compile(r'\w{3}\d')
+
+
+def get_keyword_pattern():
+    '''货代、排除、运输方式和标记关键字合成的正则，长的关键字在前'''
+    keywords = {uploaded_keyword, weekly_summary_keyword}
+    for profile in forwarder_profiles.values():
+        keywords.add(profile['sheet_keyword'])
+        keywords.update(profile['exclude_keywords'])
+        for rule_keywords, check_col in profile['check_col_rules']:
+            keywords.update(rule_keywords)
+    return re.compile('|'.join(re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True)))
+
+
+keyword_pattern = get_keyword_pattern()
+service_keywords = {keyword for profile in forwarder_profiles.values() for rule_keywords, check_col in profile['check_col_rules'] for keyword in rule_keywords}
+
+
+def parse_sheet_title(sheet_name):
+    '''解析一个sheet页名称，各项含义见模块说明，名称中没有的项为None'''
+    keywords = keyword_pattern.findall(sheet_name)
+    keyword_set = frozenset(keywords)
+
+    date = None
+    warehouse_code = None
+    match_date = date_pattern.search(sheet_name)
+    if match_date:
+        date = match_date.group()
+        match_warehouse_code = warehouse_code_pattern.search(sheet_name, match_date.end())
+        if match_warehouse_code:
+            warehouse_code = match_warehouse_code.group()
+    match_month = month_pattern.match(sheet_name)
+
+    forwarder = None
+    for name, profile in forwarder_profiles.items():
+        if profile['sheet_keyword'] in keyword_set and not any(keyword in keyword_set for keyword in profile['exclude_keywords']):
+            forwarder = name
+            break
+
+    return {
+        'sheet_name': sheet_name,
+        'date': date,
+        'month': int(match_month.group(1)) if match_month else None,
+        'warehouse_code': warehouse_code,
+        'forwarder': forwarder,
+        'services': tuple(keyword for keyword in keywords if keyword in service_keywords),
+        'keywords': keyword_set,
+        'uploaded': uploaded_keyword in keyword_set,
+        'weekly_summary': weekly_summary_keyword in keyword_set
+    }
+
+
+def parse_sheet_titles(sheets_info):
+    '''一次解析全部sheet页名称，结果存入每个sheet页信息的title中'''
+    for info in sheets_info:
+        info['title'] = parse_sheet_title(info['sheet_name'])
+    return sheets_info
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from invoice_engine.feishu import feishu_get
+
+
+def get_sheet_info(spreadsheet_id):
+    '''获取运费计算器全部sheet页数据，包含sheet_name与对应sheet_range，以及sheet页的行数row_count和列数column_count（未返回时为None）'''
+    url = f"https://open.feishu.cn/open-apis/sheets/v3/spreadsheets/{spreadsheet_id}/sheets/query"
+    params = {
+        "valueRenderOption": "ToString",
+        "dateTimeRenderOption": "FormattedString"
+    }
+    res = feishu_get(url, params=params)
+    data = res.json()
+    sheets_info = []
+    for sheet in data['data']['sheets']:
+        sheet_name = sheet['title']
+        sheet_range = sheet['sheet_id']  # 从sheet_id中提取
+        grid_properties = sheet.get('grid_properties') or {}
+        sheets_info.append({
+            "sheet_name": sheet_name,
+            "sheet_range": sheet_range,
+            "row_count": grid_properties.get('row_count'),
+            "column_count": grid_properties.get('column_count')
+        })
+    return sheets_info
+
+
+def get_sheet_values(spreadsheet_id, range_):
+    '''下载云表格指定范围的全部数据'''
+    url = f'https://open.feishu.cn/open-apis/sheets/v2/spreadsheets/{spreadsheet_id}/values/{range_}'
+    params = {
+        "valueRenderOption": "ToString",
+        "dateTimeRenderOption": "FormattedString"
+    }
+    response = feishu_get(url, params=params)
+    data = response.json()
+    return data.get('data', {}).get('valueRange', {}).get('values', [])
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import pickle
+import threading
+from openpyxl import load_workbook
+
+_template_lock = threading.Lock()
+# {模板路径: (模板修改时间, 解析后工作簿的序列化数据或模板原始字节, 是否为序列化数据)}
+_template_cache = {}
+
+
+def load_template(template_path):
+    '''
+    返回发票模板的一个内存副本，直接写入后保存到发票路径即可，不再复制模板文件
+    每个模板每个进程只解析一次（模板文件被修改后会重新解析），之后的副本从内存中的序列化数据还原，比重新解析xlsx快得多
+    '''
+    mtime = os.path.getmtime(template_path)
+    with _template_lock:
+        cached = _template_cache.get(template_path)
+        if cached is None or cached[0] != mtime:
+            with open(template_path, 'rb') as f:
+                raw = f.read()
+            workbook = load_workbook(io.BytesIO(raw))
+            try:
+                cached = (mtime, pickle.dumps(workbook, protocol=pickle.HIGHEST_PROTOCOL), True)
+            except Exception as e:
+                # 模板中有无法序列化的对象时退回到缓存原始字节，每次从内存重新解析
+                print(f"发票模板 {template_path} 无法缓存解析结果，改为每次重新解析: {str(e)}")
+                cached = (mtime, raw, False)
+            _template_cache[template_path] = cached
+            return workbook
+    mtime, data, is_pickled = cached
+    if is_pickled:
+        return pickle.loads(data)
+    return load_workbook(io.BytesIO(data))
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+'''
+各货代发票的填写内容。layout函数只描述要往模板里写什么，由render.py写入（普通模式或流式模式）：
+    header: {单元格坐标: 值}，发票上半部分固定位置的单元格
+    start_row: 产品明细起始行
+    rows: 产品明细行的生成器，每行为{列字母: 值}
+    box_numbers: 每行的箱号，箱号相同的连续行按merge_columns合并
+    merge_columns: 需要合并的列号
+    images: [{'cell': 图片所在单元格, 'file_token': 图片file_token, 'path': 本地图片路径}]
+    image_cache_dir: 缩略图缓存目录
+'''
+from openpyxl.utils import get_column_letter
+from invoice_engine.images import fetch_images
+from invoice_engine.metrics import timed
+
+# 标准箱号对应的长宽高
+box_sizes = {'1号箱': (53, 29, 37), '2号箱': (53, 23, 29), '3号箱': (43, 21, 27), '4号箱': (35, 19, 23)}
+
+
+def get_box_dimensions(box_size):
+    '''解析箱规，支持"长*宽*高"和标准箱号两种写法，无法识别返回None'''
+    if '*' in box_size:
+        return tuple(box_size.split('*'))
+    return box_sizes.get(box_size)
+
+
+def get_run_spans(values):
+    '''把连续相同的值分为一组，返回每组的(起始下标, 结束下标)，结束下标包含在组内'''
+    spans = []
+    start = 0
+    for idx in range(1, len(values) + 1):
+        if idx == len(values) or values[idx] != values[start]:
+            spans.append((start, idx - 1))
+            start = idx
+    return spans
+
+
+def get_merge_ranges(start_row, current_box_num_List, columns):
+    '''箱号相同的连续行属于同一箱：算出所有箱的行范围在指定列上的合并区域（单行的箱无需合并）'''
+    column_letters = [get_column_letter(column) for column in columns]
+    return [
+        f'{letter}{start_row + start}:{letter}{start_row + end}'
+        for start, end in get_run_spans(current_box_num_List)
+        if end > start
+        for letter in column_letters
+    ]
+
+
+def get_weitu_invoice_layout(sheet_invoice, reference_number, profile):
+    '''为途发票的填写内容'''
+    sheet_name = sheet_invoice['sheet_name']
+    product_info_list = sheet_invoice['product_info_list']
+    current_box_num_List = sheet_invoice['current_box_num_List']
+
+    # 发票上半部分固定信息填写
+    header = {
+        'B3': reference_number,
+        'B5': '美国',
+        'B6': sheet_invoice['total_box_num'],
+        'B7': '买单报关',
+        'B11': '否',
+        'E3': sheet_invoice['amazon_warehouse_code']
+    }
+    if '加班' in sheet_name:
+        header['B4'] = '美森加班卡派'
+    elif '正班' in sheet_name:
+        header['B4'] = '美森正班卡派'
+    elif '普船' in sheet_name:
+        header['B4'] = 'OA普船统配卡派'
+
+    # 发票下半部分
+    def rows():
+        for info, current_box_number in zip(product_info_list, current_box_num_List):
+            row = {
+                'A': current_box_number,
+                'B': info.get("ShipmentID", ""),
+                'C': info.get("ReferenceID", ""),
+                'D': info.get("real_weight", ""),
+                'H': info.get("HS_code", ""),
+                'I': info.get("Chinese_name", ""),
+                'J': info.get("English_name", ""),
+                'K': info.get("product_num", ""),
+                'L': info.get("price", ""),
+                'M': info.get("brand", ""),
+                'O': info.get("Material", ""),
+                'P': info.get("Application", "")
+            }
+            # 处理箱子尺寸
+            dimensions = get_box_dimensions(info["box_size"])
+            if dimensions:
+                row['E'], row['F'], row['G'] = dimensions
+            yield row
+
+    return {
+        'header': header,
+        'start_row': 16,
+        'rows': rows(),
+        'box_numbers': current_box_num_List,
+        'merge_columns': profile['merge_columns'],
+        'images': [],
+        'image_cache_dir': None
+    }
+
+
+def prepare_desu_invoice(sheet_invoice, profile, shipment_addresses):
+    '''渲染前批量下载本张发票用到的图片（已缓存的不再下载）'''
+    with timed('images', sheet_invoice['sheet_name']):
+        sheet_invoice['image_paths'] = fetch_images([info["Img_file_token"] for info in sheet_invoice['product_info_list']], profile['save_image_path'])
+
+
+def get_desu_invoice_layout(sheet_invoice, reference_number, profile):
+    '''德速发票的填写内容，产品图片放在S列'''
+    sheet_name = sheet_invoice['sheet_name']
+    product_info_list = sheet_invoice['product_info_list']
+    current_box_num_List = sheet_invoice['current_box_num_List']
+    image_paths = sheet_invoice['image_paths']
+    start_row = 13  # 起始行
+
+    # 发票上半部分信息填写
+    header = {
+        'B2': reference_number,
+        'B3': sheet_invoice['amazon_warehouse_code'],
+        'B4': '门到门',
+        'B10': 'U0001',
+        'B11': '普货（无任何电池）',
+        'G2': '美国',
+        'G3': '否',
+        'G4': '是',
+        'G9': sheet_invoice['total_box_num'],
+        'G10': 'USD'
+    }
+
+    # 发票下半部分信息填写
+    def rows():
+        for info, current_box_number in zip(product_info_list, current_box_num_List):
+            row = {
+                'A': info.get("ShipmentID", ""),
+                'B': info.get("ReferenceID", ""),
+                'C': current_box_number,
+                'D': info.get("SKU", ""),
+                'E': info.get("English_name", ""),
+                'F': info.get("Chinese_name", ""),
+                'G': info.get("HS_code", ""),
+                'H': info.get("brand", ""),
+                'I': info.get("Material", ""),
+                'J': info.get("Application", ""),
+                'N': info.get("Declared_quantity", ""),
+                'T': info.get("real_weight", "")
+            }
+
+            # 申报价格按1.2倍填写，多维表格中为空（字符串）时原样写入
+            price_rmb = info.get("price_rmb", "")
+            if type(price_rmb) != str:
+                price_rmb = price_rmb * profile['price_multiplier']
+            row['Q'] = price_rmb
+
+            price = info.get("price", "")
+            if type(price) != str:
+                price = price * profile['price_multiplier']
+            row['R'] = price
+
+            # 处理箱子尺寸
+            dimensions = get_box_dimensions(info["box_size"])
+            if dimensions:
+                row['U'], row['V'], row['W'] = dimensions
+            yield row
+
+    # 插入图片
+    images = []
+    for idx, info in enumerate(product_info_list, start=start_row):
+        img_path = image_paths.get(info["Img_file_token"])
+        if img_path:
+            images.append({'cell': f'S{idx}', 'file_token': info["Img_file_token"], 'path': img_path})
+        else:
+            print(f"没有找到产品 {info.get('Chinese_name', '')} 对应的图片，保持该行为空，{sheet_name}")
+
+    return {
+        'header': header,
+        'start_row': start_row,
+        'rows': rows(),
+        'box_numbers': current_box_num_List,
+        'merge_columns': profile['merge_columns'],
+        'images': images,
+        'image_cache_dir': profile['save_image_path']
+    }
+
+
+def prepare_yinghe_invoice(sheet_invoice, profile, shipment_addresses):
+    '''渲染前按第一个货件查询收货地址（本地地址索引中没有时才下载FBA货件表）'''
+    with timed('address', sheet_invoice['sheet_name']):
+        sheet_invoice['address'] = shipment_addresses.get(sheet_invoice['product_info_list'][0]["ShipmentID"])
+
+
+def get_yinghe_invoice_layout(sheet_invoice, reference_number, profile):
+    '''盈和发票的填写内容，包括收货地址和右上角按货件汇总的箱数'''
+    product_info_list = sheet_invoice['product_info_list']
+    current_box_num_List = sheet_invoice['current_box_num_List']
+    product_name_list = sheet_invoice['product_name_list']
+    product_box_num_list = sheet_invoice['product_box_num_list']
+    address = sheet_invoice['address']
+
+    # 写入相同的数据项
+    header = {
+        'E3': 'YHE20210413024YHYB',
+        'E4': reference_number,
+        'E6': sheet_invoice['amazon_warehouse_code'],
+        'E7': 'FBA地址',
+        'E8': 'Amazon',
+        'E9': 'Amazon',
+        'E10': address["delivery_address"],
+        'E12': address["city"],
+        'E13': address["continent"],
+        'E14': address["postcode"],
+        'E15': address["country_code"],
+        'E16': '13800138000',
+        'E17': '否',
+        'E19': '否'
+    }
+
+    def rows():
+        for info in product_info_list:
+            yield {
+                'B': info["product_box_num"],
+                'C': info["Chinese_name"],
+                'D': info["English_name"],
+                'E': info["price"],
+                'F': info["declaration_quantity"],
+                'G': info["Material"],
+                'H': info["Material"],
+                'R': info["HS_code"],
+                'S': info["Application"]
+            }
+
+    # 发票上半部分右上角按id分箱数S计算逻辑
+    # 1. 生成子产品到原始product的索引映射
+    expanded_indices = []
+    for p_idx, product_name in enumerate(product_name_list):
+        sub_products = product_name.split('，')  # 拆分混箱子产品
+        expanded_indices.extend([p_idx] * len(sub_products))
+
+    # 验证映射长度
+    if len(expanded_indices) != len(product_info_list):
+        raise ValueError(f"数据不匹配: product_info应有{len(expanded_indices)}条，实际{len(product_info_list)}条")
+
+    # 2. 按ShipmentID和ReferenceID分组，并记录已处理的原始product索引
+    shipment_groups = {}
+    for info_idx, info in enumerate(product_info_list):
+        p_idx = expanded_indices[info_idx]  # 当前子产品对应的原始product索引
+        key = (info["ShipmentID"], info["ReferenceID"])
+        box_num = product_box_num_list[p_idx]  # 原始product的箱数
+
+        if key not in shipment_groups:
+            shipment_groups[key] = {
+                "total_boxes": 0,
+                "processed_p_indices": set()  # 记录该组已处理的原始product索引
+            }
+
+        # 核心逻辑：每个原始product只在该Shipment组中累加一次箱数
+        if p_idx not in shipment_groups[key]["processed_p_indices"]:
+            shipment_groups[key]["total_boxes"] += box_num
+            shipment_groups[key]["processed_p_indices"].add(p_idx)
+
+    # 3. 将结果写入L列、M列、N列
+    write_row = 4
+    for key in shipment_groups:
+        shipment_id, ref_id = key
+        header[f'L{write_row}'] = shipment_id
+        header[f'M{write_row}'] = ref_id
+        header[f'N{write_row}'] = shipment_groups[key]["total_boxes"]
+        write_row += 1
+
+    return {
+        'header': header,
+        'start_row': 23,
+        'rows': rows(),
+        'box_numbers': current_box_num_List,
+        'merge_columns': profile['merge_columns'],
+        'images': [],
+        'image_cache_dir': None
+    }
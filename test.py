@@ -1,30 +1,104 @@
 # -*- coding: utf-8 -*-
-from fastapi import FastAPI, Body
-from fastapi.responses import FileResponse
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import FileResponse, Response, StreamingResponse
 import uvicorn
 import os
-from 为途发票填写自动化 import run  # 假设原始脚本叫做这个
+import re
+from invoice_engine import archive, jobs, metrics
+from invoice_engine.profiles import forwarder_profiles
 
 app = FastAPI()
 
+
+def get_job_or_404(job_id):
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+
 @app.post("/generate-invoice")
-def generate_invoice():
-    try:
-        run()  # 原函数里会批量读取并处理所有sheet
+def generate_invoice(
+    forwarder: Optional[List[str]] = Query(None, description="只生成这些货代的发票，不指定时生成为途发票"),
+    date: Optional[str] = Query(None, description="生成哪一期的发票，如6.13，不指定时为最新一期"),
+    sheet_name: Optional[List[str]] = Query(None, description="只生成这些sheet页的发票（名称精确匹配）"),
+    force: bool = Query(False, description="输入数据没有变化的sheet页也重新生成发票")
+):
+    if forwarder is not None:
+        unknown_forwarders = [name for name in forwarder if name not in forwarder_profiles]
+        if unknown_forwarders:
+            raise HTTPException(status_code=400, detail=f"未知的货代: {', '.join(unknown_forwarders)}")
+    elif sheet_name is None:
+        forwarder = ['为途']
+    if date is not None and not re.fullmatch(r'\d+\.\d+', date):
+        raise HTTPException(status_code=400, detail=f"日期格式应为月.日，如6.13: {date}")
+
+    # 只登记任务，立即返回任务id；同样的任务已在生成时返回同一个任务
+    job = jobs.submit_job(forwarder, date, sheet_name, force)
+    return {"job_id": job['job_id'], "status": job['status']}
+
+
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: str):
+    job = get_job_or_404(job_id)
+    return {key: value for key, value in job.items() if key not in ('invoice_files', 'report')}
+
+
+@app.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    job = get_job_or_404(job_id)
+    if job['status'] in ('queued', 'running'):
+        return {"job_id": job_id, "status": job['status'], "invoices": []}
+    invoices = [
+        {"index": index, "filename": os.path.basename(path), "url": f"/jobs/{job_id}/invoices/{index}"}
+        for index, path in enumerate(job['invoice_files'])
+    ]
+    return {"job_id": job_id, "status": job['status'], "error": job['error'], "invoices": invoices}
+
+
+@app.get("/jobs/{job_id}/report")
+def get_job_report(job_id: str):
+    '''任务的运行报告：各阶段耗时、各飞书接口的调用次数和下载字节数、每个sheet页的耗时'''
+    job = get_job_or_404(job_id)
+    if job['report'] is None:
+        return {"job_id": job_id, "status": job['status'], "report": None}
+    return {"job_id": job_id, "status": job['status'], "report": job['report'].to_dict()}
+
+
+@app.get("/jobs/{job_id}/invoices/{index}")
+def download_job_invoice(job_id: str, index: int):
+    job = get_job_or_404(job_id)
+    if not 0 <= index < len(job['invoice_files']):
+        raise HTTPException(status_code=404, detail="发票不存在")
+    invoice_file = job['invoice_files'][index]
+    if not os.path.exists(invoice_file):
+        raise HTTPException(status_code=404, detail="发票文件已被删除")
+    return FileResponse(invoice_file, filename=os.path.basename(invoice_file))
+
+
+@app.get("/jobs/{job_id}/invoices.zip")
+def download_job_invoices_zip(job_id: str):
+    '''任务的全部发票打成一个zip下载；任务还在运行时边生成边输出，直到任务结束'''
+    job = get_job_or_404(job_id)
+    # 压缩包内按货代目录存放，如 为途发票/xxx.xlsx
+    files = (
+        (path, f"{os.path.basename(os.path.dirname(path))}/{os.path.basename(path)}")
+        for path in archive.iter_produced_files(job['invoice_files'], lambda: jobs.is_job_done(job))
+    )
+    return StreamingResponse(
+        archive.iter_zip(files),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="invoices_{job_id}.zip"'}
+    )
 
-        # 示例：返回最新生成的文件路径（实际可根据生成逻辑动态定位）
-        latest_file = get_latest_invoice_file()
-        return FileResponse(latest_file, filename=os.path.basename(latest_file))
 
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+# 安装了prometheus_client时提供Prometheus指标
+if metrics.prometheus_client is not None:
+    @app.get("/metrics")
+    def get_metrics():
+        return Response(metrics.prometheus_client.generate_latest(), media_type=metrics.prometheus_client.CONTENT_TYPE_LATEST)
 
-def get_latest_invoice_file():
-    dir_path = r'D:\work\data\发票\为途'
-    files = [os.path.join(dir_path, f) for f in os.listdir(dir_path) if f.endswith('.xlsx')]
-    if not files:
-        raise FileNotFoundError("未找到发票文件")
-    return max(files, key=os.path.getctime)
 
 if __name__ == '__main__':
-    uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="127.0.0.1", port=8000)
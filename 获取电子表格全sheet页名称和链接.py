@@ -1,32 +1,15 @@
 # -*- coding: utf-8 -*-
-import json
 import re
-import requests
+from invoice_engine.feishu import feishu_get
 
 
-def get_access_token():
-    '''获取访问凭证'''
-    url = 'https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal'
-    data = {
-        "app_id": "xx",
-        "app_secret": "xx"
-    }
-    ret = requests.post(url=url, data=json.dumps(data, ensure_ascii=False))
-    data = ret.json()
-    return data.get("tenant_access_token")
-
-
-def get_sheet_info(spreadsheet_id, access_token):
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
+def get_sheet_info(spreadsheet_id):
     url = f"https://open.feishu.cn/open-apis/sheets/v3/spreadsheets/{spreadsheet_id}/sheets/query"
     params = {
         "valueRenderOption": "ToString",
         "dateTimeRenderOption": "FormattedString"
     }
-    res = requests.get(url, headers=headers, params=params)
+    res = feishu_get(url, params=params)
     data = res.json()
     sheets_info = []
     for sheet in data['data']['sheets']:
@@ -39,10 +22,9 @@ def get_sheet_info(spreadsheet_id, access_token):
     return sheets_info
 
 
-access_token = get_access_token()
 # 电子表格运费计算器id（每三个月会更新一次）
 spreadsheet_id = 'NDLHsXUy4hC4JmtH2wTcP9mWncV'
-sheets_info = get_sheet_info(spreadsheet_id, access_token)
+sheets_info = get_sheet_info(spreadsheet_id)
 
 weritu_count = 0
 yinghe_count = 0